@@ -4,71 +4,78 @@ Quick script to check if FFmpeg is installed and accessible
 This is required for audio format conversion
 """
 
-import subprocess
 import sys
 
-def check_ffmpeg():
-    """Check if FFmpeg is installed and accessible"""
-    try:
-        result = subprocess.run(
-            ['ffmpeg', '-version'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            version_line = result.stdout.split('\n')[0]
-            print(f"✅ FFmpeg is installed: {version_line}")
-            return True
-        else:
-            print("❌ FFmpeg command failed")
-            return False
-    except FileNotFoundError:
-        print("❌ FFmpeg is NOT installed or not in PATH")
-        print("\nTo install FFmpeg:")
-        print("  Ubuntu/Debian: sudo apt-get install ffmpeg")
-        print("  macOS:         brew install ffmpeg")
-        print("  CentOS/RHEL:   sudo yum install ffmpeg")
-        return False
-    except Exception as e:
-        print(f"❌ Error checking FFmpeg: {e}")
-        return False
+import diag_cache
+
+_NL_BAR = "\n" + "=" * 50
+_OK = "✅"
+_BAD = "❌"
+_WARN = "⚠️"
+
+def check_ffmpeg(need_version=False):
+    """
+    Check if FFmpeg is installed and accessible
+    Only spawns `ffmpeg -version` when need_version is set; otherwise a
+    PATH lookup is enough to answer the question
+    Returns (ok, report text)
+    """
+    ffmpeg_path = diag_cache.ffmpeg_path()
+    if ffmpeg_path is None:
+        return False, "\n".join([
+            f"{_BAD} FFmpeg is NOT installed or not in PATH",
+            "\nTo install FFmpeg:",
+            "  Ubuntu/Debian: sudo apt-get install ffmpeg",
+            "  macOS:         brew install ffmpeg",
+            "  CentOS/RHEL:   sudo yum install ffmpeg",
+        ])
+    if not need_version:
+        return True, f"{_OK} FFmpeg is installed: {ffmpeg_path}"
+    ok, detail = diag_cache.ffmpeg_ok()
+    if ok:
+        return True, f"{_OK} FFmpeg is installed: {detail}"
+    return False, f"{_BAD} FFmpeg command failed: {detail}"
 
 def check_pydub():
-    """Check if pydub can access FFmpeg"""
+    """
+    Check if pydub can access FFmpeg
+    Returns (ok, report text)
+    """
+    ok, _ = diag_cache.pydub_ok()
+    if not ok:
+        return False, "\n".join([
+            f"{_BAD} pydub is not installed",
+            "   Install with: pip install pydub",
+        ])
+    # Try to get FFmpeg path
     try:
-        from pydub import AudioSegment
-        # Try to get FFmpeg path
-        try:
-            import pydub.utils
-            ffmpeg_path = pydub.utils.which("ffmpeg")
-            if ffmpeg_path:
-                print(f"✅ pydub found FFmpeg at: {ffmpeg_path}")
-                return True
-            else:
-                print("❌ pydub cannot find FFmpeg")
-                return False
-        except:
-            print("⚠️  Could not check pydub FFmpeg path, but pydub is installed")
-            return True
-    except ImportError:
-        print("❌ pydub is not installed")
-        print("   Install with: pip install pydub")
-        return False
+        ffmpeg_path = diag_cache.pydub_ffmpeg_path()
+    except Exception:
+        return True, f"{_WARN}  Could not check pydub FFmpeg path, but pydub is installed"
+    if ffmpeg_path:
+        return True, f"{_OK} pydub found FFmpeg at: {ffmpeg_path}"
+    return False, f"{_BAD} pydub cannot find FFmpeg"
 
 if __name__ == "__main__":
     print("Checking FFmpeg installation...\n")
     
-    ffmpeg_ok = check_ffmpeg()
-    print()
-    pydub_ok = check_pydub()
+    # Both checks are independent, so run them side by side. Each one
+    # returns its report as a single string and the reports are written in
+    # a fixed order afterwards so output reads the same as a sequential run.
+    ex = diag_cache.executor()
+    ffmpeg_future = ex.submit(check_ffmpeg, need_version=True)
+    pydub_future = ex.submit(check_pydub)
+    ffmpeg_ok, ffmpeg_report = ffmpeg_future.result()
+    pydub_ok, pydub_report = pydub_future.result()
+    
+    sys.stdout.write(ffmpeg_report + "\n\n" + pydub_report + "\n")
     
-    print("\n" + "="*50)
+    print(_NL_BAR)
     if ffmpeg_ok and pydub_ok:
-        print("✅ All checks passed! Audio conversion should work.")
+        print(f"{_OK} All checks passed! Audio conversion should work.")
         sys.exit(0)
     else:
-        print("❌ Some checks failed. Please install missing dependencies.")
+        print(f"{_BAD} Some checks failed. Please install missing dependencies.")
         sys.exit(1)
 
 
@@ -0,0 +1,126 @@
+"""
+Memoized FFmpeg/pydub probes shared by check_ffmpeg.py and
+diagnose_m4a_error.py
+Each probe runs at most once per process; call reset() to run them again
+(e.g. after installing FFmpeg or changing PATH)
+"""
+
+import atexit
+import functools
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep Windows from flashing a console window for the ffmpeg probe
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+_probes = []
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _memoize(func):
+    """Cache a zero-argument probe and make its first call thread-safe"""
+    cached = functools.lru_cache(maxsize=1)(func)
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper():
+        with lock:
+            return cached()
+
+    wrapper.cache_clear = cached.cache_clear
+    _probes.append(wrapper)
+    return wrapper
+
+
+def reset():
+    """Forget every cached probe result"""
+    for probe in _probes:
+        probe.cache_clear()
+
+
+def executor():
+    """
+    Thread pool shared by the diagnostic checks
+    Created on first use and kept for the life of the process, so callers
+    that run the checks repeatedly don't pay for a new pool every time
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='diag')
+            atexit.register(_executor.shutdown, wait=False)
+        return _executor
+
+
+@_memoize
+def ffmpeg_path():
+    """Path to the ffmpeg binary, or None if it is not on PATH"""
+    return shutil.which("ffmpeg")
+
+
+@_memoize
+def ffmpeg_ok() -> tuple[bool, str]:
+    """
+    Run `ffmpeg -version`
+    Returns (ok, detail) where detail is the version line on success and
+    a short reason otherwise
+    """
+    path = ffmpeg_path()
+    if path is None:
+        return False, "not found in PATH"
+    try:
+        proc = subprocess.Popen(
+            [path, '-hide_banner', '-version'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            creationflags=_NO_WINDOW
+        )
+    except FileNotFoundError:
+        return False, "not found in PATH"
+    except Exception as e:
+        return False, str(e)
+    # Only the first line is wanted. Closing the pipe early may end ffmpeg
+    # with SIGPIPE, so success is judged by the line, not the exit status.
+    killer = threading.Timer(5, proc.kill)
+    killer.start()
+    try:
+        with proc:
+            version_line = proc.stdout.readline().strip()
+            proc.stdout.close()
+    finally:
+        killer.cancel()
+    if not version_line:
+        return False, f"exited with status {proc.returncode}"
+    return True, version_line
+
+
+@_memoize
+def audio_segment():
+    """pydub's AudioSegment class (raises ImportError if pydub is missing)"""
+    from pydub import AudioSegment
+    return AudioSegment
+
+
+@_memoize
+def pydub_ok() -> tuple[bool, str]:
+    """
+    Check that pydub can be imported
+    Returns (ok, detail) where detail is the import error on failure
+    """
+    try:
+        audio_segment()
+    except ImportError as e:
+        return False, str(e)
+    return True, ""
+
+
+@_memoize
+def pydub_ffmpeg_path():
+    """Where pydub finds FFmpeg (pydub rescans PATH on every call)"""
+    import pydub.utils
+    return pydub.utils.which("ffmpeg")
@@ -4,185 +4,351 @@ Diagnostic script to check why M4A conversion is failing
 Run this on your server to diagnose the issue
 """
 
+import functools
+import http.client
+import io
+import json
+import mmap
 import os
+import re
 import sys
-import subprocess
-import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
 from pathlib import Path
 
-def check_ffmpeg():
-    """Check if FFmpeg is installed and accessible"""
-    print("=" * 60)
-    print("1. Checking FFmpeg installation...")
-    print("=" * 60)
-    try:
-        result = subprocess.run(
-            ['ffmpeg', '-version'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            print("✅ FFmpeg is installed")
-            print(f"   Version: {result.stdout.split(chr(10))[0]}")
-            return True
-        else:
-            print("❌ FFmpeg check failed")
-            return False
-    except FileNotFoundError:
-        print("❌ FFmpeg is NOT installed or not in PATH")
-        print("   Install with: sudo apt-get install ffmpeg")
-        return False
-    except Exception as e:
-        print(f"❌ Error checking FFmpeg: {e}")
-        return False
-
-def check_pydub():
-    """Check if pydub is installed"""
-    print("\n" + "=" * 60)
-    print("2. Checking pydub installation...")
-    print("=" * 60)
-    try:
-        from pydub import AudioSegment
-        print("✅ pydub is installed")
-        return True
-    except ImportError:
-        print("❌ pydub is NOT installed")
-        print("   Install with: pip install pydub")
-        return False
-
-def test_m4a_conversion():
-    """Test if M4A conversion works"""
-    print("\n" + "=" * 60)
-    print("3. Testing M4A conversion capability...")
-    print("=" * 60)
+import diag_cache
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_BAR = "=" * 60
+_NL_BAR = "\n" + _BAR
+_OK = "✅"
+_BAD = "❌"
+_WARN = "⚠️"
+
+# DIAG_FAILFAST=1 skips the remaining checks when FFmpeg is missing (for CI)
+FAILFAST = os.environ.get("DIAG_FAILFAST") == "1"
+
+# Everything check_backend_code looks for, matched in a single pass.
+# Longer alternatives come first so "def decode_with_pydub" wins over
+# the bare function name on the definition line.
+_BACKEND_TOKENS = re.compile(
+    rb"def decode_with_pydub|from pydub import AudioSegment|"
+    rb"decode_with_pydub|preprocess_audio|ffmpeg|startup",
+    re.IGNORECASE,
+)
+
+# (report line, tokens that must all be present), in report order
+_BACKEND_CHECKS = (
+    ("decode_with_pydub function", {b"def decode_with_pydub"}),
+    ("pydub import", {b"from pydub import audiosegment"}),
+    ("preprocess_audio decodes with pydub", {b"decode_with_pydub", b"preprocess_audio"}),
+    ("FFmpeg check on startup", {b"ffmpeg", b"startup"}),
+)
+_BACKEND_NEEDED = set().union(*(needed for _, needed in _BACKEND_CHECKS))
+
+# With pyahocorasick installed all tokens are found in one automaton pass
+# (over lowercased text); otherwise _BACKEND_TOKENS does the scan
+_BACKEND_AUTOMATON = None
+if ahocorasick is not None:
+    _BACKEND_AUTOMATON = ahocorasick.Automaton()
+    for token in _BACKEND_NEEDED:
+        _BACKEND_AUTOMATON.add_word(token.decode("ascii"), token)
+    _BACKEND_AUTOMATON.make_automaton()
+
+_SERVER_HOST = "aiapp.sazjoo.com"
+_CONNECT_TIMEOUT = 1.0  # seconds
+_READ_TIMEOUT = 4.0  # seconds
+
+# Resolved once at import: main.py next to the real script, even when the
+# script is run through a symlink
+_BACKEND_PATH = Path(__file__).resolve().parent / "main.py"
+_BACKEND_STAT_TTL = 5.0  # seconds
+_backend_stat = None  # (checked_at, exists)
+
+def _backend_exists():
+    """os.path.isfile() on the backend file, re-checked at most every few seconds"""
+    global _backend_stat
+    now = time.monotonic()
+    if _backend_stat is None or now - _backend_stat[0] > _BACKEND_STAT_TTL:
+        _backend_stat = (now, os.path.isfile(_BACKEND_PATH))
+    return _backend_stat[1]
+
+def _scan_backend(content):
+    """Set of lowercased _BACKEND_TOKENS found in content (bytes or mmap)"""
+    if _BACKEND_AUTOMATON is not None:
+        text = content[:].lower().decode("latin-1")
+        return {token for _, token in _BACKEND_AUTOMATON.iter(text)}
+    return {token.lower() for token in _BACKEND_TOKENS.findall(content)}
+
+def check_ffmpeg(need_version=False):
+    """
+    Check if FFmpeg is installed and accessible
+    Only spawns `ffmpeg -version` when need_version is set
+    Returns (result, report text)
+    """
+    lines = [
+        _NL_BAR,
+        "1. Checking FFmpeg installation...",
+        _BAR,
+    ]
+    ffmpeg_path = diag_cache.ffmpeg_path()
+    if ffmpeg_path is None:
+        lines.append(f"{_BAD} FFmpeg is NOT installed or not in PATH")
+        lines.append("   Install with: sudo apt-get install ffmpeg")
+        return False, "\n".join(lines)
+    if not need_version:
+        lines.append(f"{_OK} FFmpeg is installed: {ffmpeg_path}")
+        return True, "\n".join(lines)
+    ok, detail = diag_cache.ffmpeg_ok()
+    if ok:
+        lines.append(f"{_OK} FFmpeg is installed")
+        lines.append(f"   Version: {detail}")
+    else:
+        lines.append(f"{_BAD} FFmpeg check failed: {detail}")
+    return ok, "\n".join(lines)
+
+def check_pydub(ffmpeg_ok=True):
+    """
+    Check if pydub is installed
+    Skipped (None) when FFmpeg is missing, since pydub cannot convert
+    anything without it and importing it is not free
+    Returns (result, report text)
+    """
+    lines = [
+        _NL_BAR,
+        "2. Checking pydub installation...",
+        _BAR,
+    ]
+    if not ffmpeg_ok:
+        lines.append(f"{_WARN}  Skipped: FFmpeg is required for pydub conversion")
+        return None, "\n".join(lines)
+    ok, _ = diag_cache.pydub_ok()
+    if ok:
+        lines.append(f"{_OK} pydub is installed")
+    else:
+        lines.append(f"{_BAD} pydub is NOT installed")
+        lines.append("   Install with: pip install pydub")
+    return ok, "\n".join(lines)
+
+def test_m4a_conversion(pydub_ok=True):
+    """
+    Test if M4A conversion works
+    Encodes a short silent clip to M4A in memory and decodes it again,
+    which exercises FFmpeg's AAC encoder/decoder through pydub.
+    Skipped (None) unless pydub is available
+    Returns (result, report text)
+    """
+    lines = [
+        _NL_BAR,
+        "3. Testing M4A conversion capability...",
+        _BAR,
+    ]
+    if not pydub_ok:
+        lines.append(f"{_WARN}  Skipped: requires FFmpeg and pydub")
+        return None, "\n".join(lines)
     
     try:
-        from pydub import AudioSegment
-        import tempfile
-        
-        # Create a dummy test (we can't test without an actual M4A file)
-        print("   Note: This requires an actual M4A file to test")
-        print("   To test manually, run:")
-        print("   python3 -c \"from pydub import AudioSegment; AudioSegment.from_file('test.m4a', format='m4a')\"")
-        return True
+        AudioSegment = diag_cache.audio_segment()
+        buf = io.BytesIO()
+        AudioSegment.silent(duration=100).export(buf, format='ipod')
+        buf.seek(0)
+        decoded = AudioSegment.from_file(buf, format='m4a')
+        lines.append(f"{_OK} M4A encode/decode works ({len(decoded)}ms test clip)")
+        return True, "\n".join(lines)
     except Exception as e:
-        print(f"❌ Error: {e}")
-        return False
+        lines.append(f"{_BAD} M4A conversion failed: {e}")
+        return False, "\n".join(lines)
 
 def check_backend_code():
-    """Check if backend code has conversion logic"""
-    print("\n" + "=" * 60)
-    print("4. Checking backend code for conversion logic...")
-    print("=" * 60)
-    
-    backend_file = Path(__file__).parent / "main.py"
-    if not backend_file.exists():
-        print(f"❌ Backend file not found: {backend_file}")
-        return False
-    
-    with open(backend_file, 'r') as f:
-        content = f.read()
-    
-    checks = {
-        "convert_audio_to_wav function": "def convert_audio_to_wav" in content,
-        "pydub import": "from pydub import AudioSegment" in content,
-        "preprocess_audio calls convert": "convert_audio_to_wav" in content and "preprocess_audio" in content,
-        "FFmpeg check on startup": "ffmpeg" in content.lower() and "startup" in content.lower(),
-    }
+    """
+    Check if backend code has conversion logic
+    Returns (result, report text)
+    """
+    lines = [
+        _NL_BAR,
+        "4. Checking backend code for conversion logic...",
+        _BAR,
+    ]
     
-    all_passed = True
-    for check_name, passed in checks.items():
-        if passed:
-            print(f"✅ {check_name}: Found")
+    if not _backend_exists():
+        lines.append(f"{_BAD} Backend file not found: {_BACKEND_PATH}")
+        return False, "\n".join(lines)
+    
+    # Map the file instead of reading it: the OS pages it in on demand and
+    # the bytes regex scans it in place, with no copy or decode
+    # (the Aho-Corasick path needs one lowercased copy)
+    seen = set()
+    with open(_BACKEND_PATH, 'rb') as f:
+        try:
+            content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            content = None  # empty file, which mmap refuses to map
+        if content is not None:
+            with content:
+                seen = _scan_backend(content)
+    
+    if b"def decode_with_pydub" in seen:
+        seen.add(b"decode_with_pydub")
+    
+    for check_name, needed in _BACKEND_CHECKS:
+        if needed <= seen:
+            lines.append(f"{_OK} {check_name}: Found")
         else:
-            print(f"❌ {check_name}: NOT found")
-            all_passed = False
+            lines.append(f"{_BAD} {check_name}: NOT found")
     
-    return all_passed
+    all_passed = not (_BACKEND_NEEDED - seen)
+    return all_passed, "\n".join(lines)
 
 def check_server_running():
-    """Check if server is running"""
-    print("\n" + "=" * 60)
-    print("5. Checking if backend server is running...")
-    print("=" * 60)
+    """
+    Check if server is running
+    Uses a short connect timeout so an unreachable host fails fast, and a
+    longer read timeout for the health response itself
+    Returns (result, report text)
+    """
+    lines = [
+        _NL_BAR,
+        "5. Checking if backend server is running...",
+        _BAR,
+    ]
     
+    conn = http.client.HTTPSConnection(_SERVER_HOST, timeout=_CONNECT_TIMEOUT)
     try:
-        import requests
-        try:
-            response = requests.get("https://aiapp.sazjoo.com/health", timeout=5)
-            if response.status_code == 200:
-                print("✅ Backend server is running")
-                print(f"   Response: {response.json()}")
-                return True
-            else:
-                print(f"⚠️  Backend responded with status {response.status_code}")
-                return False
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Cannot reach backend server: {e}")
-            return False
-    except ImportError:
-        print("⚠️  requests library not installed, skipping server check")
-        print("   Install with: pip install requests")
-        return None
+        conn.connect()
+        conn.sock.settimeout(_READ_TIMEOUT)
+        conn.request("GET", "/health")
+        response = conn.getresponse()
+        body = response.read()
+        if response.status == 200:
+            try:
+                body = json.loads(body)
+            except ValueError:
+                body = body.decode(errors="replace")
+            lines.append(f"{_OK} Backend server is running")
+            lines.append(f"   Response: {body}")
+            return True, "\n".join(lines)
+        else:
+            lines.append(f"{_WARN}  Backend responded with status {response.status}")
+            return False, "\n".join(lines)
+    except (OSError, http.client.HTTPException) as e:
+        lines.append(f"{_BAD} Cannot reach backend server: {e}")
+        return False, "\n".join(lines)
+    finally:
+        conn.close()
 
 def main():
-    print("\n" + "=" * 60)
-    print("M4A Conversion Diagnostic Tool")
-    print("=" * 60)
-    print()
-    
-    results = {
-        "FFmpeg": check_ffmpeg(),
-        "pydub": check_pydub(),
-        "Backend Code": check_backend_code(),
-        "Server Running": check_server_running(),
+    sys.stdout.write("\n".join([
+        _NL_BAR,
+        "M4A Conversion Diagnostic Tool",
+        _BAR,
+    ]) + "\n")
+    
+    tasks = {
+        "FFmpeg": functools.partial(check_ffmpeg, need_version=True),
+        "pydub": check_pydub,
+        "M4A Conversion": test_m4a_conversion,
+        "Backend Code": check_backend_code,
+        "Server Running": check_server_running,
+    }
+    
+    # The checks are independent, so run them all at once and print each
+    # section as soon as its check finishes; the total is bounded by the
+    # slowest probe (usually the server). Each check returns its section as
+    # one string, so sections never interleave. pydub waits for FFmpeg and
+    # the M4A test waits for pydub. With DIAG_FAILFAST=1 everything waits
+    # for FFmpeg and is skipped if it failed.
+    deferred = {"pydub", "M4A Conversion"}
+    if FAILFAST:
+        deferred = set(tasks) - {"FFmpeg"}
+    results = {}
+    ex = diag_cache.executor()
+    pending = {
+        ex.submit(check): name
+        for name, check in tasks.items()
+        if name not in deferred
     }
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            results[name], report = future.result()
+            sys.stdout.write(report + "\n")
+            sys.stdout.flush()
+            if name == "pydub":
+                future = ex.submit(test_m4a_conversion, pydub_ok=results[name])
+                pending[future] = "M4A Conversion"
+            if name != "FFmpeg":
+                continue
+            if FAILFAST and not results[name]:
+                sys.stdout.write(f"\n{_WARN}  Skipping remaining checks (DIAG_FAILFAST)\n")
+                results.update(dict.fromkeys(deferred))
+                continue
+            for other in deferred - {"M4A Conversion"}:
+                if other == "pydub":
+                    future = ex.submit(check_pydub, ffmpeg_ok=results[name])
+                else:
+                    future = ex.submit(tasks[other])
+                pending[future] = other
+    
+    # Summary and recommendations keep the canonical order
+    results = {name: results[name] for name in tasks}
     
-    print("\n" + "=" * 60)
-    print("SUMMARY")
-    print("=" * 60)
+    lines = [
+        _NL_BAR,
+        "SUMMARY",
+        _BAR,
+    ]
     
     for check_name, result in results.items():
         if result is True:
-            status = "✅ PASS"
+            status = f"{_OK} PASS"
         elif result is False:
-            status = "❌ FAIL"
+            status = f"{_BAD} FAIL"
         else:
-            status = "⚠️  SKIP"
-        print(f"{check_name}: {status}")
+            status = f"{_WARN}  SKIP"
+        lines.append(f"{check_name}: {status}")
     
-    print("\n" + "=" * 60)
-    print("RECOMMENDATIONS")
-    print("=" * 60)
+    lines += [
+        _NL_BAR,
+        "RECOMMENDATIONS",
+        _BAR,
+    ]
     
     if not results.get("FFmpeg"):
-        print("1. ❌ CRITICAL: Install FFmpeg")
-        print("   sudo apt-get update")
-        print("   sudo apt-get install -y ffmpeg")
-        print("   ffmpeg -version  # Verify")
+        lines.append(f"1. {_BAD} CRITICAL: Install FFmpeg")
+        lines.append("   sudo apt-get update")
+        lines.append("   sudo apt-get install -y ffmpeg")
+        lines.append("   ffmpeg -version  # Verify")
     
-    if not results.get("pydub"):
-        print("2. ❌ CRITICAL: Install pydub")
-        print("   pip install pydub")
+    if results.get("pydub") is False:
+        lines.append(f"2. {_BAD} CRITICAL: Install pydub")
+        lines.append("   pip install pydub")
     
-    if not results.get("Backend Code"):
-        print("3. ❌ CRITICAL: Backend code is missing conversion logic")
-        print("   Make sure main.py has the updated code with convert_audio_to_wav()")
+    if results.get("Backend Code") is False:
+        lines.append(f"3. {_BAD} CRITICAL: Backend code is missing conversion logic")
+        lines.append("   Make sure main.py has the updated code with decode_with_pydub()")
     
     if results.get("Server Running") is False:
-        print("4. ⚠️  Backend server is not running or not accessible")
-        print("   Restart your backend service after making changes")
+        lines.append(f"4. {_WARN}  Backend server is not running or not accessible")
+        lines.append("   Restart your backend service after making changes")
+    
+    if results.get("M4A Conversion") is False:
+        lines.append(f"5. {_BAD} CRITICAL: FFmpeg cannot encode/decode M4A (AAC)")
+        lines.append("   Reinstall a full FFmpeg build: sudo apt-get install --reinstall ffmpeg")
     
     if all(results.values()):
-        print("\n✅ All checks passed!")
-        print("   If you're still getting errors, check server logs:")
-        print("   - sudo journalctl -u <your-service-name> -f")
-        print("   - Or check your PM2/supervisor logs")
+        lines.append(f"\n{_OK} All checks passed!")
+        lines.append("   If you're still getting errors, check server logs:")
+        lines.append("   - sudo journalctl -u <your-service-name> -f")
+        lines.append("   - Or check your PM2/supervisor logs")
     else:
-        print("\n❌ Some checks failed. Fix the issues above and restart your server.")
+        lines.append(f"\n{_BAD} Some checks failed. Fix the issues above and restart your server.")
+    
+    sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     main()
-
-
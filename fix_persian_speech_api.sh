@@ -96,7 +96,7 @@ echo ""
 # Check if main.py has conversion code
 if [ ! -z "$MAIN_PY" ] && [ -f "$MAIN_PY" ]; then
     echo "8. Checking if main.py has conversion code..."
-    if grep -q "convert_audio_to_wav" "$MAIN_PY"; then
+    if grep -q "decode_with_pydub" "$MAIN_PY"; then
         echo "   ✅ Conversion function found"
     else
         echo "   ⚠️  Conversion function NOT found - code may be old"
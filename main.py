@@ -7,14 +7,24 @@ audio to text.
 """
 
 import asyncio
+import atexit
 import base64
+import hashlib
+import io
 import logging
+import logging.handlers
+import math
 import os
-import tempfile
-import traceback
+import queue
+import shutil
+import subprocess
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Optional
 
+import aiohttp
 import numpy as np
 import torch
 import uvicorn
@@ -24,13 +34,64 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, model_validator
 from pydub import AudioSegment
 from scipy.io import wavfile
-from scipy.signal import resample
+from scipy.signal import resample_poly
 from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 
-# Configure logging
+try:
+    import av
+except ImportError:  # optional: falls back to pydub + FFmpeg
+    av = None
+
+try:
+    import onnxruntime
+except ImportError:  # optional: only needed with USE_ONNX=1
+    onnxruntime = None
+
+try:
+    import soundfile
+except ImportError:  # optional: in-process WAV/FLAC/OGG reading
+    soundfile = None
+
+try:
+    import pybase64
+except ImportError:  # optional: SIMD base64 decoding for /transcribe-base64
+    pybase64 = None
+
+try:
+    import blake3
+except ImportError:  # optional: faster hashing for the result cache
+    blake3 = None
+
+# Configure logging. Records are formatted and queued; a background
+# thread writes them out, so request handling never waits on stderr
+_log_queue = queue.SimpleQueue()
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _start_log_listener():
+    """
+    Start the thread that writes out queued log records. Threads don't
+    survive fork, so this runs again in each forked process (gunicorn
+    --preload imports this module in the master, then forks the workers)
+    """
+    global _log_listener
+    _log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+    _log_listener.start()
+
+
+def _stop_log_listener():
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
+_start_log_listener()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_start_log_listener)
+atexit.register(_stop_log_listener)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
 )
 logger = logging.getLogger(__name__)
 
@@ -59,6 +120,21 @@ app.add_middleware(
 model: Optional[Wav2Vec2ForCTC] = None
 processor: Optional[Wav2Vec2Processor] = None
 model_loaded = False
+onnx_session = None  # set when USE_ONNX=1 and onnxruntime is installed
+
+# Cached from the processor at load time (see _cache_processor_settings)
+_normalize_inputs = True
+_ctc_tokens: list[str] = []  # token id -> output text
+_ctc_blank_id = 0
+
+# (num_samples, input buffer, mask buffer, graph, logits buffer), shortest first
+_cuda_graphs: list[tuple] = []
+# Pinned host buffer for batch inputs on GPU (see _build_inputs)
+_pinned_inputs: Optional[torch.Tensor] = None
+# torch.compile'd model, set when USE_TORCH_COMPILE=1 and compiling works
+_compiled_model = None
+# torch.jit traced model, the CPU fallback when torch.compile fails
+_traced_model = None
 
 # Configuration
 MODEL_NAME = "jonatasgrosman/wav2vec2-large-xlsr-53-persian"
@@ -66,6 +142,51 @@ TARGET_SAMPLE_RATE = 16000
 MAX_AUDIO_LENGTH = 30  # seconds
 MIN_AUDIO_LENGTH = 0.5  # seconds
 SUPPORTED_FORMATS = [".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac"]
+# Concurrent requests are batched: up to MAX_BATCH requests that arrive
+# within BATCH_WINDOW_MS share one forward pass
+MAX_BATCH = 8
+BATCH_WINDOW_MS = 10
+BATCH_BUCKET_SECONDS = 2  # only clips of similar duration are batched
+# Audio longer than CHUNK_SECONDS is split into windows overlapping by
+# CHUNK_OVERLAP_SECONDS that run as one batch, bounding activation memory
+# on small GPUs (0 disables; whole clips are slightly more accurate)
+CHUNK_SECONDS = int(os.environ.get("CHUNK_SECONDS", "0"))
+CHUNK_OVERLAP_SECONDS = 1
+if 0 < CHUNK_SECONDS <= CHUNK_OVERLAP_SECONDS:
+    logger.warning(
+        "CHUNK_SECONDS=%d must be more than the %ds overlap; chunking disabled",
+        CHUNK_SECONDS, CHUNK_OVERLAP_SECONDS,
+    )
+    CHUNK_SECONDS = 0
+# Serve the model through ONNX Runtime instead of PyTorch eager mode
+USE_ONNX = os.environ.get("USE_ONNX") == "1"
+# Replay CUDA graphs captured at startup for single requests on GPU,
+# one per length bucket (seconds); longer audio runs eagerly
+USE_CUDA_GRAPHS = os.environ.get("USE_CUDA_GRAPHS") == "1"
+CUDA_GRAPH_BUCKETS = (2, 5, 10, 15, 30)
+# Run the PyTorch model through torch.compile. Inputs are zero-padded to
+# the CUDA_GRAPH_BUCKETS lengths and batches to a COMPILE_BATCH_SIZES
+# size, and every such pair is compiled at startup (warm_up_model)
+USE_TORCH_COMPILE = os.environ.get("USE_TORCH_COMPILE") == "1"
+COMPILE_BATCH_SIZES = tuple(
+    size for size in (1, 2, 4, 8, 16, 32) if size < MAX_BATCH
+) + (MAX_BATCH,)
+# Forward passes per input length in warm_up_model
+WARM_UP_PASSES = 3
+# Threads for decoding/resampling uploads, kept apart from the thread
+# that runs inference
+PREP_THREADS = int(os.environ.get("PREP_THREADS", os.cpu_count() or 1))
+# Results of this many recent uploads are kept, so a retried upload of
+# the same bytes is answered without decoding or inference (0 disables)
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+# Requests being decoded, queued or transcribed at once; more are turned
+# away with 503 instead of piling up in memory
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", str(4 * MAX_BATCH)))
+# Larger uploads/downloads are refused with 413 (30s of even 48kHz stereo
+# float WAV is ~11.5MB); bodies are read UPLOAD_CHUNK_SIZE at a time so
+# an oversized one is stopped without being read in full
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
 
 # Pydantic models for request/response
@@ -102,17 +223,193 @@ class Base64TranscriptionRequest(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
+    requests_in_flight: int = 0
+    max_in_flight: int = MAX_IN_FLIGHT
     service: str = "Persian Speech-to-Text FastAPI Service"
     version: str = "1.0.0"
 
 
 # Model loading functions
+def create_onnx_session(cache_dir: str):
+    """
+    Export the (fp32) PyTorch model to ONNX once and open it with ONNX
+    Runtime. On CPU the exported graph is also int8-quantized.
+    Exported files are kept in cache_dir and reused on later starts
+    """
+    onnx_path = os.path.join(cache_dir, MODEL_NAME.replace("/", "--") + ".onnx")
+    if not os.path.exists(onnx_path):
+        logger.info("Exporting model to ONNX: %s", onnx_path)
+        dummy = torch.zeros(1, TARGET_SAMPLE_RATE, dtype=torch.float32)
+        dummy_mask = torch.ones(1, TARGET_SAMPLE_RATE, dtype=torch.int64)
+        torch.onnx.export(
+            model,
+            (dummy, dummy_mask),
+            onnx_path,
+            input_names=["input_values", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_values": {0: "batch", 1: "time"},
+                "attention_mask": {0: "batch", 1: "time"},
+                "logits": {0: "batch", 1: "frames"},
+            },
+            opset_version=17,
+        )
+
+    providers = ["CPUExecutionProvider"]
+    if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        providers.insert(0, "CUDAExecutionProvider")
+    else:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = onnx_path[: -len(".onnx")] + ".int8.onnx"
+        if not os.path.exists(int8_path):
+            logger.info("Quantizing ONNX model to int8: %s", int8_path)
+            # MatMul only, like the PyTorch path: ONNX Runtime has no CPU
+            # kernel for quantized convolutions
+            quantize_dynamic(
+                onnx_path, int8_path,
+                op_types_to_quantize=["MatMul"],
+                weight_type=QuantType.QInt8,
+            )
+        onnx_path = int8_path
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = onnxruntime.InferenceSession(onnx_path, options, providers=providers)
+    logger.info("ONNX Runtime session ready (%s)", session.get_providers()[0])
+    return session
+
+
+def _cache_processor_settings():
+    """
+    Keep what transcription needs from the processor, so requests build
+    model inputs and decode CTC output without going through it
+    """
+    global _normalize_inputs, _ctc_tokens, _ctc_blank_id
+
+    tokenizer = processor.tokenizer
+    _normalize_inputs = processor.feature_extractor.do_normalize
+    _ctc_tokens = []
+    for token in tokenizer.convert_ids_to_tokens(list(range(len(tokenizer)))):
+        if token == tokenizer.word_delimiter_token:
+            token = " "
+        elif getattr(tokenizer, "do_lower_case", False):
+            token = token.lower()
+        _ctc_tokens.append(token)
+    _ctc_blank_id = tokenizer.pad_token_id
+
+
+def _capture_cuda_graphs():
+    """
+    Capture the batch-of-one forward pass as a CUDA graph for each length
+    in CUDA_GRAPH_BUCKETS, so a request replays one graph instead of
+    launching every kernel. Audio is zero-padded to its bucket and the
+    attention mask hides the padding. On failure the model runs eagerly
+    """
+    global _cuda_graphs
+
+    graphs = []
+    try:
+        with torch.no_grad():
+            buffers = []
+            for seconds in CUDA_GRAPH_BUCKETS:
+                num_samples = seconds * TARGET_SAMPLE_RATE
+                input_buf = torch.zeros(1, num_samples, device="cuda", dtype=torch.float16)
+                mask_buf = torch.ones(1, num_samples, device="cuda", dtype=torch.int64)
+                buffers.append((num_samples, input_buf, mask_buf))
+
+            # Warm up on a side stream before capturing (cuDNN/cuBLAS setup)
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _, input_buf, mask_buf in buffers:
+                    for _ in range(3):
+                        model(input_buf, attention_mask=mask_buf)
+            torch.cuda.current_stream().wait_stream(stream)
+
+            # Capture longest first so the shorter graphs can share its
+            # memory pool
+            pool = None
+            for num_samples, input_buf, mask_buf in reversed(buffers):
+                graph = torch.cuda.CUDAGraph()
+                with torch.cuda.graph(graph, pool=pool):
+                    logits_buf = model(input_buf, attention_mask=mask_buf).logits
+                pool = graph.pool()
+                graphs.append((num_samples, input_buf, mask_buf, graph, logits_buf))
+    except Exception as e:
+        logger.warning("CUDA graph capture failed, running eagerly: %s", e)
+        return
+
+    _cuda_graphs = graphs[::-1]
+    logger.info("Captured CUDA graphs for %s second buckets", CUDA_GRAPH_BUCKETS)
+
+
+def _compile_model():
+    """
+    Wrap the model in torch.compile (static shapes; CUDA graphs on GPU)
+    and run it once at the shortest bucket, so a compile error shows up
+    at startup rather than on the first request. On failure the model
+    runs eagerly
+    """
+    global _compiled_model
+
+    # Every batch size/bucket pair is a separate compiled graph
+    torch._dynamo.config.cache_size_limit = max(
+        torch._dynamo.config.cache_size_limit,
+        len(COMPILE_BATCH_SIZES) * len(CUDA_GRAPH_BUCKETS),
+    )
+    compiled = torch.compile(model, mode="reduce-overhead", fullgraph=False, dynamic=False)
+    try:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+        num_samples = CUDA_GRAPH_BUCKETS[0] * TARGET_SAMPLE_RATE
+        with torch.no_grad():
+            compiled(
+                torch.zeros(1, num_samples, device=device, dtype=dtype),
+                attention_mask=torch.ones(1, num_samples, device=device, dtype=torch.int64),
+            )
+    except Exception as e:
+        if torch.cuda.is_available():
+            logger.warning("torch.compile failed, running eagerly: %s", e)
+        else:
+            logger.warning("torch.compile failed, tracing instead: %s", e)
+            _trace_model()
+        return
+
+    _compiled_model = compiled
+    logger.info("Model compiled with torch.compile")
+
+
+def _trace_model():
+    """
+    torch.jit.trace and freeze the CPU model (torch.compile can't handle
+    the int8 one). The traced graph isn't tied to the example's shape, so
+    inputs need no bucket padding. On failure the model runs eagerly
+    """
+    global _traced_model
+
+    num_samples = CUDA_GRAPH_BUCKETS[0] * TARGET_SAMPLE_RATE
+    example = (
+        torch.zeros(1, num_samples),
+        torch.ones(1, num_samples, dtype=torch.int64),
+    )
+    try:
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, example, strict=False))
+    except Exception as e:
+        logger.warning("torch.jit.trace failed, running eagerly: %s", e)
+        return
+
+    _traced_model = traced
+    logger.info("Model traced with torch.jit.trace")
+
+
 async def load_model():
     """Load the Persian wav2vec2 model and processor"""
-    global model, processor, model_loaded
+    global model, processor, model_loaded, onnx_session, _pinned_inputs
 
     if not model_loaded:
-        print("Loading Persian wav2vec2 model...")
+        logger.info("Loading Persian wav2vec2 model...")
         try:
             # Set cache directory to a writable location
             cache_dir = os.environ.get("TRANSFORMERS_CACHE", "/tmp/transformers_cache")
@@ -127,362 +424,582 @@ async def load_model():
             )
             model.eval()
 
-            # Move to GPU if available
-            if torch.cuda.is_available():
-                model = model.cuda()
-                print("Model loaded on GPU")
+            if USE_ONNX and onnxruntime is None:
+                logger.warning("USE_ONNX=1 but onnxruntime is not installed, using PyTorch")
+
+            if USE_ONNX and onnxruntime is not None:
+                # Inference goes through ONNX Runtime (see _forward)
+                onnx_session = create_onnx_session(cache_dir)
+            elif torch.cuda.is_available():
+                # Any fp32 matmuls/convolutions left on the GPU run on
+                # TF32 tensor cores (Ampere and newer)
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.allow_tf32 = True
+                torch.set_float32_matmul_precision("high")
+                # cuDNN autotunes the feature-encoder convolutions once per
+                # input shape. That only pays off when lengths are padded
+                # to fixed buckets; eager requests have a new length each
+                # time and would be re-tuned on every call
+                torch.backends.cudnn.benchmark = USE_CUDA_GRAPHS or USE_TORCH_COMPILE
+                # Move to GPU in half precision so the transformer
+                # matmuls run on tensor cores
+                model = model.cuda().half()
+                logger.info("Model loaded on GPU (fp16)")
+                _pinned_inputs = torch.empty(
+                    MAX_BATCH * MAX_AUDIO_LENGTH * TARGET_SAMPLE_RATE,
+                    dtype=torch.float32,
+                ).pin_memory()
+                if USE_CUDA_GRAPHS:
+                    _capture_cuda_graphs()
             else:
-                print("Model loaded on CPU")
+                # int8 weights for the Linear layers (FBGEMM kernels);
+                # the conv feature extractor stays fp32
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                logger.info("Model loaded on CPU (int8 dynamic quantization)")
 
+            if USE_TORCH_COMPILE and onnx_session is None:
+                _compile_model()
+
+            _cache_processor_settings()
             model_loaded = True
-            print("Model loaded successfully!")
+            logger.info("Model loaded successfully!")
 
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            raise e
+        except Exception:
+            logger.exception("Error loading model")
+            raise
 
 
-def convert_audio_to_wav(input_path: str, output_path: str) -> str:
+def decode_to_mono16k(data: bytes) -> np.ndarray:
     """
-    Convert any audio format to WAV using pydub
-    Returns the path to the converted WAV file
+    Decode audio bytes in any format FFmpeg understands with PyAV
+    Returns mono int16 samples at TARGET_SAMPLE_RATE
+    """
+    resampler = av.audio.resampler.AudioResampler(
+        format='s16', layout='mono', rate=TARGET_SAMPLE_RATE
+    )
+    chunks = []
+    with av.open(io.BytesIO(data)) as container:
+        for frame in container.decode(audio=0):
+            for resampled in resampler.resample(frame):
+                chunks.append(resampled.to_ndarray())
+        # Flush samples buffered in the resampler
+        for resampled in resampler.resample(None):
+            chunks.append(resampled.to_ndarray())
+    if not chunks:
+        raise ValueError("No audio frames could be decoded")
+    return np.concatenate(chunks, axis=1)[0]
+
+
+# File extension by the first four bytes of the data (all containers
+# libsndfile can read; see decode_with_soundfile)
+_MAGIC = {b"RIFF": ".wav", b"RIFX": ".wav", b"fLaC": ".flac", b"OggS": ".ogg"}
+
+# File extension by upload Content-Type
+_CONTENT_TYPE_EXT = {
+    'audio/wav': '.wav',
+    'audio/mpeg': '.mp3',
+    'audio/mp4': '.m4a',
+    'audio/x-m4a': '.m4a',
+    'audio/flac': '.flac',
+    'audio/ogg': '.ogg',
+    'audio/aac': '.aac',
+}
+
+
+def _detect_ext(data: bytes) -> str:
+    """Guess the file extension from the data's header (.m4a if unknown)"""
+    head = data[:4]
+    ext = _MAGIC.get(head)
+    if ext is not None:
+        return ext
+    if head[:3] == b"ID3" or head[:2] == b"\xff\xfb":
+        return ".mp3"
+    return ".m4a"  # M4A/MP4 (mobile recordings) has no fixed first bytes
+
+
+def decode_with_soundfile(data: bytes) -> Optional[tuple[int, np.ndarray]]:
+    """
+    Read WAV/FLAC/OGG bytes with libsndfile as float32 (any bit depth,
+    no FFmpeg)
+    Returns (sample rate, samples), or None if soundfile isn't installed
+    or can't read the data
+    """
+    if soundfile is None or data[:4] not in _MAGIC:
+        return None
+    try:
+        audio, sr = soundfile.read(io.BytesIO(data), dtype="float32")
+    except Exception as e:
+        logger.debug("[PREPROCESS] soundfile could not read the audio: %s", e)
+        return None
+    return sr, audio
+
+
+def _check_duration(duration: float):
+    """Raise ValueError if duration (seconds) is outside the accepted range"""
+    if duration < MIN_AUDIO_LENGTH:
+        raise ValueError(
+            f"Audio too short: {duration:.2f}s " f"(minimum: {MIN_AUDIO_LENGTH}s)"
+        )
+
+    if duration > MAX_AUDIO_LENGTH:
+        raise ValueError(
+            f"Audio too long: {duration:.2f}s " f"(maximum: {MAX_AUDIO_LENGTH}s)"
+        )
+
+
+def decode_with_pydub(data: bytes, file_ext: str = "") -> np.ndarray:
+    """
+    Decode audio in any format with pydub/FFmpeg, in memory
+    file_ext (e.g. ".m4a") selects the input format; without it FFmpeg
+    probes the data
+    Returns 16-bit mono samples at TARGET_SAMPLE_RATE
     
     Supports: MP3, M4A, FLAC, OGG, AAC, WMA, WAV, MP4, 3GP, etc.
     
     Requires: FFmpeg must be installed on the system
     """
+    logger.debug("[CONVERT] Starting conversion: %d bytes (format: %s)", len(data), file_ext or "unknown")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[CONVERT] Input header (hex): %s", data[:16].hex(" "))
+
+    # Map extensions to pydub format names
+    format_map = {
+        '.wav': 'wav',
+        '.mp3': 'mp3',
+        '.m4a': 'm4a',
+        '.mp4': 'm4a',  # MP4 audio is usually M4A
+        '.flac': 'flac',
+        '.ogg': 'ogg',
+        '.aac': 'aac',
+        '.wma': 'wma',
+        '.3gp': '3gp',
+    }
+    
+    # Get format, default to auto-detect if unknown
+    audio_format = format_map.get(file_ext, None)
+    logger.debug("[CONVERT] Detected format: %s", audio_format or "auto-detect")
+    
+    # Load audio using pydub
     try:
-        # Detect format from file extension
-        file_ext = Path(input_path).suffix.lower()
-        
-        logger.info(f"🔄 [CONVERT] Starting conversion: {input_path} (format: {file_ext})")
-        logger.info(f"   [CONVERT] Output path: {output_path}")
-        
-        # Check if input file exists
-        if not os.path.exists(input_path):
-            logger.error(f"   [CONVERT] ❌ Input file does not exist: {input_path}")
-            raise FileNotFoundError(f"Input file does not exist: {input_path}")
-        
-        # Get file size for logging
-        file_size = os.path.getsize(input_path)
-        logger.info(f"   [CONVERT] Input file size: {file_size} bytes")
-        
-        # Read and log file header
-        with open(input_path, 'rb') as f:
-            header_bytes = f.read(16)
-            header_hex = ' '.join(f'{b:02x}' for b in header_bytes)
-            logger.info(f"   [CONVERT] Input file header (hex): {header_hex}")
-            logger.info(f"   [CONVERT] Input file header (raw): {header_bytes}")
-        
-        # Map extensions to pydub format names
-        format_map = {
-            '.wav': 'wav',
-            '.mp3': 'mp3',
-            '.m4a': 'm4a',
-            '.mp4': 'm4a',  # MP4 audio is usually M4A
-            '.flac': 'flac',
-            '.ogg': 'ogg',
-            '.aac': 'aac',
-            '.wma': 'wma',
-            '.3gp': '3gp',
-        }
-        
-        # Get format, default to auto-detect if unknown
-        audio_format = format_map.get(file_ext, None)
-        logger.info(f"   [CONVERT] Detected format: {audio_format or 'auto-detect'}")
-        
-        # Load audio file using pydub
-        try:
-            logger.info(f"   [CONVERT] Attempting to load audio file...")
-            if audio_format:
-                if audio_format == 'wav':
-                    logger.info(f"   [CONVERT] Loading as WAV...")
-                    audio = AudioSegment.from_wav(input_path)
-                elif audio_format == 'mp3':
-                    logger.info(f"   [CONVERT] Loading as MP3...")
-                    audio = AudioSegment.from_mp3(input_path)
-                elif audio_format == 'ogg':
-                    logger.info(f"   [CONVERT] Loading as OGG...")
-                    audio = AudioSegment.from_ogg(input_path)
-                else:
-                    # Use from_file for formats like m4a, flac, aac, etc.
-                    logger.info(f"   [CONVERT] Loading as {audio_format.upper()} using from_file()...")
-                    audio = AudioSegment.from_file(input_path, format=audio_format)
-            else:
-                # Auto-detect format (pydub will try to detect)
-                logger.info(f"   [CONVERT] Auto-detecting format...")
-                audio = AudioSegment.from_file(input_path)
-            logger.info(f"   [CONVERT] ✅ Audio loaded successfully")
-        except Exception as load_error:
-            error_msg = str(load_error)
-            logger.error(f"   [CONVERT] ❌ Failed to load audio file: {error_msg}")
-            logger.error(f"   [CONVERT] Full traceback: {traceback.format_exc()}")
-            if 'ffmpeg' in error_msg.lower() or 'not found' in error_msg.lower():
-                raise ValueError(
-                    f"FFmpeg is required for audio conversion but was not found. "
-                    f"Install it with: sudo apt-get install ffmpeg (Ubuntu/Debian) or "
-                    f"brew install ffmpeg (macOS). Original error: {error_msg}"
-                ) from load_error
-            raise ValueError(f"Failed to load audio file: {error_msg}") from load_error
-        
-        logger.info(f"   [CONVERT] ✅ Audio loaded: {len(audio)}ms, {audio.frame_rate}Hz, {audio.channels} channels")
-        
-        # Export as WAV with proper settings for wav2vec2
-        # Set to 16kHz mono (wav2vec2 requirement)
-        logger.info(f"   [CONVERT] Setting frame rate to {TARGET_SAMPLE_RATE}Hz and converting to mono...")
-        audio = audio.set_frame_rate(TARGET_SAMPLE_RATE)
-        audio = audio.set_channels(1)  # Convert to mono
-        
-        # Export as WAV (PCM 16-bit)
+        # from_wav/from_mp3/... are thin wrappers around from_file;
+        # format=None lets FFmpeg detect the format
+        audio = AudioSegment.from_file(io.BytesIO(data), format=audio_format)
+    except Exception as load_error:
+        error_msg = str(load_error)
+        logger.error("[CONVERT] ❌ Failed to load audio: %s", error_msg)
+        if 'ffmpeg' in error_msg.lower() or 'not found' in error_msg.lower():
+            raise ValueError(
+                f"Audio conversion failed: "
+                f"FFmpeg is required for audio conversion but was not found. "
+                f"Install it with: sudo apt-get install ffmpeg (Ubuntu/Debian) or "
+                f"brew install ffmpeg (macOS). Original error: {error_msg}"
+            ) from load_error
+        raise ValueError(
+            f"Audio conversion failed: Failed to load audio file: {error_msg}"
+        ) from load_error
+    
+    logger.debug(
+        "[CONVERT] Audio loaded: %dms, %dHz, %d channels",
+        len(audio), audio.frame_rate, audio.channels,
+    )
+    _check_duration(len(audio) / 1000)
+    
+    # 16kHz mono 16-bit (wav2vec2 requirement), taken straight from the
+    # decoded PCM: no WAV export (a second FFmpeg run) and no WAV parse
+    audio = audio.set_frame_rate(TARGET_SAMPLE_RATE).set_channels(1).set_sample_width(2)
+    return np.frombuffer(audio.raw_data, dtype=np.int16)
+
+
+def load_audio_with_pydub(data: bytes, file_ext: str = "") -> tuple[int, np.ndarray]:
+    """
+    Read audio bytes as samples: WAV with scipy, anything else decoded
+    with pydub/FFmpeg
+    Used when PyAV is not installed
+    Returns (sample rate, samples)
+    """
+    header = data[:4]
+    is_wav = header == b'RIFF' or header == b'RIFX'
+    logger.debug("[PREPROCESS] File header (raw): %r", header)
+    
+    # ALWAYS convert if extension is not .wav, regardless of header check
+    # This ensures M4A, MP3, etc. are always converted
+    if file_ext:
+        should_convert = file_ext != '.wav'
+    else:
+        should_convert = not is_wav
+    
+    if should_convert:
+        logger.info("[PREPROCESS] 🔄 Decoding %s audio with pydub", file_ext or "unknown format")
         try:
-            logger.info(f"   [CONVERT] Exporting to WAV format: {output_path}")
-            logger.info(f"   [CONVERT] Using FFmpeg parameters: ['-acodec', 'pcm_s16le']")
-            audio.export(
-                output_path,
-                format='wav',
-                parameters=['-acodec', 'pcm_s16le']  # Ensure 16-bit PCM
-            )
-            logger.info(f"   [CONVERT] ✅ Export completed")
-        except Exception as export_error:
-            error_msg = str(export_error)
-            logger.error(f"   [CONVERT] ❌ Failed to export WAV file: {error_msg}")
-            logger.error(f"   [CONVERT] Full traceback: {traceback.format_exc()}")
-            if 'ffmpeg' in error_msg.lower() or 'not found' in error_msg.lower():
-                raise ValueError(
-                    f"FFmpeg is required for audio export but was not found. "
-                    f"Install it with: sudo apt-get install ffmpeg. Original error: {error_msg}"
-                ) from export_error
-            raise ValueError(f"Failed to export WAV file: {error_msg}") from export_error
-        
-        # Verify the output file exists and has correct header
-        if not os.path.exists(output_path):
-            logger.error(f"   [CONVERT] ❌ Output file was not created: {output_path}")
-            raise ValueError(f"Conversion failed: output file was not created at {output_path}")
-        
-        output_size = os.path.getsize(output_path)
-        logger.info(f"   [CONVERT] Output file size: {output_size} bytes")
-        
-        # Verify WAV header
-        logger.info(f"   [CONVERT] Verifying WAV header...")
-        with open(output_path, 'rb') as f:
-            header = f.read(4)
-            header_hex = ' '.join(f'{b:02x}' for b in header)
-            logger.info(f"   [CONVERT] Output file header (hex): {header_hex}")
-            logger.info(f"   [CONVERT] Output file header (raw): {header}")
-            if header not in [b'RIFF', b'RIFX']:
-                logger.error(f"   [CONVERT] ❌ Invalid WAV header! Expected RIFF or RIFX, got: {header}")
-                raise ValueError(
-                    f"Conversion failed: output file doesn't have WAV header. "
-                    f"Got: {header} (expected RIFF or RIFX). "
-                    f"This usually means FFmpeg conversion failed."
-                )
-            logger.info(f"   [CONVERT] ✅ Valid WAV header confirmed")
-        
-        logger.info(f"   [CONVERT] ✅ Successfully converted to WAV: {output_path}")
-        return output_path
+            return TARGET_SAMPLE_RATE, decode_with_pydub(data, file_ext)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Audio conversion failed: {e}") from e
+    
+    logger.debug("[PREPROCESS] Audio is already WAV format, no conversion needed")
+    try:
+        sr, audio = wavfile.read(io.BytesIO(data))
+        logger.debug("[PREPROCESS] Loaded WAV: %d samples at %dHz", len(audio), sr)
     except Exception as e:
-        logger.error(f"❌ [CONVERT] Error converting audio to WAV: {e}")
-        logger.error(f"   [CONVERT] Input file: {input_path}")
-        logger.error(f"   [CONVERT] Output file: {output_path}")
-        logger.error(f"   [CONVERT] Full traceback: {traceback.format_exc()}")
-        # Re-raise with more context
-        raise
+        error_msg = str(e)
+        logger.error("[PREPROCESS] ❌ Failed to read WAV with scipy: %s", error_msg)
+        # A RIFF/RIFX complaint means the data isn't WAV despite its name
+        if 'RIFF' in error_msg or 'RIFX' in error_msg:
+            raise ValueError(
+                f"File format error - the file is not a WAV file. "
+                f"Original error: {error_msg}"
+            ) from e
+        raise ValueError(f"Failed to read WAV file: {error_msg}") from e
+    
+    return sr, audio
+
+
+def _to_mono_float32(audio: np.ndarray) -> np.ndarray:
+    """
+    Convert decoded samples to mono float32 in a single pass
+    Integer samples are not divided down to [-1, 1] here: the peak
+    normalization at the end of preprocessing cancels any constant scale
+    """
+    if audio.dtype == np.uint8:
+        audio = audio.astype(np.float32)
+        audio -= 128.0
+    if audio.ndim > 1:
+        # Casts while reducing, without a float copy of every channel
+        return audio.mean(axis=1, dtype=np.float32)
+    return audio.astype(np.float32, copy=False)
+
+
+# Float audio peaking in (_NEAR_FULL_SCALE, 1.0] is left unscaled: the
+# model inputs are mean/variance normalized anyway (_build_inputs)
+_NEAR_FULL_SCALE = 0.95
+
+
+def _peak_normalize(audio: np.ndarray) -> np.ndarray:
+    """
+    Scale float audio in place so its peak is 1.0 (silence, and audio
+    already near full scale, are left as is)
+    """
+    peak = max(audio.max(), -audio.min())
+    if peak > 0 and not _NEAR_FULL_SCALE < peak <= 1.0:
+        audio *= 1.0 / peak
+    return audio
+
+
+def _to_normalized_float32(audio: np.ndarray) -> np.ndarray:
+    """
+    Convert mono (signed or float) samples to float32 with peak 1.0
+    The peak is found on the source samples (int16 reads half the bytes
+    of float32), so conversion and scaling are one multiply pass
+    """
+    peak = max(audio.max().item(), -audio.min().item())
+    if audio.dtype == np.float32 and _NEAR_FULL_SCALE < peak <= 1.0:
+        return audio
+    if peak > 0:
+        return np.multiply(audio, np.float32(1.0 / peak), dtype=np.float32)
+    return audio.astype(np.float32)
 
 
 def preprocess_audio(
-    audio_file_path: str, target_sr: int = TARGET_SAMPLE_RATE
+    audio_bytes: bytes, file_ext: str = "", target_sr: int = TARGET_SAMPLE_RATE
 ) -> tuple[np.ndarray, float]:
     """
-    Preprocess audio file for wav2vec2 model
-    - Convert any format to WAV if needed
+    Preprocess audio for wav2vec2 model
+    - Decode any format from memory (PyAV when installed, otherwise
+      scipy for WAV and pydub/FFmpeg for the rest); file_ext (e.g. ".m4a")
+      is a format hint, and without it the format is detected from the data
     - Convert to 16kHz sample rate
     - Normalize audio
     - Return audio array and duration
     """
-    original_file_path = audio_file_path
-    converted_file_path = None
-    is_wav = False
-    
     try:
-        # Check if file is already WAV by reading first bytes
-        file_ext = Path(audio_file_path).suffix.lower()
-        logger.info(f"[PREPROCESS] Processing audio file: {audio_file_path} (extension: {file_ext})")
-        
-        # Check file exists and get size
-        if os.path.exists(audio_file_path):
-            file_size = os.path.getsize(audio_file_path)
-            logger.info(f"[PREPROCESS] File size: {file_size} bytes")
-        else:
-            logger.error(f"[PREPROCESS] ❌ File does not exist: {audio_file_path}")
-            raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
-        
-        try:
-            logger.info(f"[PREPROCESS] Reading file header...")
-            with open(audio_file_path, 'rb') as f:
-                header = f.read(4)
-                header_hex = ' '.join(f'{b:02x}' for b in header)
-                logger.info(f"[PREPROCESS] File header (hex): {header_hex}")
-                logger.info(f"[PREPROCESS] File header (raw): {header}")
-                if header == b'RIFF' or header == b'RIFX':
-                    is_wav = True
-                    logger.info(f"[PREPROCESS] ✅ File is already WAV format (RIFF/RIFX header detected)")
-                else:
-                    logger.info(f"[PREPROCESS] File is NOT WAV format (header: {header})")
-        except Exception as e:
-            logger.warning(f"[PREPROCESS] ⚠️  Could not read file header: {e}")
-            logger.warning(f"[PREPROCESS] Full traceback: {traceback.format_exc()}")
-            is_wav = False
-        
-        # ALWAYS convert if extension is not .wav, regardless of header check
-        # This ensures M4A, MP3, etc. are always converted
-        should_convert = False
-        
-        if file_ext:
-            # If we have an extension, check if it's WAV
-            if file_ext != '.wav':
-                should_convert = True
-                logger.info(f"[PREPROCESS] File extension '{file_ext}' indicates non-WAV format, will convert")
-            else:
-                logger.info(f"[PREPROCESS] File extension is .wav")
-        elif not is_wav:
-            # No extension but header check says it's not WAV
-            should_convert = True
-            logger.info(f"[PREPROCESS] Header check indicates non-WAV format, will convert")
-        else:
-            # Extension is .wav and header check passed
-            should_convert = False
-            logger.info(f"[PREPROCESS] File appears to be WAV format, skipping conversion")
+        logger.debug(
+            "[PREPROCESS] Processing audio: %d bytes (extension: %s)",
+            len(audio_bytes), file_ext or "unknown",
+        )
         
-        # Convert if needed
-        if should_convert:
-            logger.info(f"[PREPROCESS] 🔄 Converting {file_ext or 'unknown format'} file to WAV format...")
-            
-            # Create temporary WAV file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_wav:
-                converted_file_path = temp_wav.name
-            logger.info(f"[PREPROCESS] Created temp WAV file: {converted_file_path}")
-            
+        # WAV/FLAC/OGG go through libsndfile when it's available; PyAV
+        # decodes and resamples everything else in-process (no FFmpeg
+        # subprocess)
+        decoded = decode_with_soundfile(audio_bytes)
+        if decoded is not None:
+            sr, audio = decoded
+            logger.debug("[PREPROCESS] Read %d samples at %dHz with soundfile", len(audio), sr)
+        elif av is not None:
             try:
-                # Convert to WAV
-                logger.info(f"[PREPROCESS] Calling convert_audio_to_wav({audio_file_path}, {converted_file_path})")
-                convert_audio_to_wav(audio_file_path, converted_file_path)
-                
-                # Verify conversion succeeded by checking the output file exists
-                logger.info(f"[PREPROCESS] Verifying converted file exists...")
-                if not os.path.exists(converted_file_path):
-                    logger.error(f"[PREPROCESS] ❌ Conversion failed: output file was not created")
-                    raise ValueError("Conversion failed: output file was not created")
-                
-                # Verify it's a valid WAV file by checking header
-                logger.info(f"[PREPROCESS] Verifying converted file has valid WAV header...")
-                with open(converted_file_path, 'rb') as f:
-                    wav_header = f.read(4)
-                    wav_header_hex = ' '.join(f'{b:02x}' for b in wav_header)
-                    logger.info(f"[PREPROCESS] Converted file header (hex): {wav_header_hex}")
-                    logger.info(f"[PREPROCESS] Converted file header (raw): {wav_header}")
-                    if wav_header not in [b'RIFF', b'RIFX']:
-                        logger.error(f"[PREPROCESS] ❌ Invalid WAV header in converted file!")
-                        raise ValueError(
-                            f"Conversion failed: output file is not a valid WAV. "
-                            f"Header: {wav_header} (expected RIFF or RIFX). "
-                            f"This usually means FFmpeg conversion failed."
-                        )
-                    logger.info(f"[PREPROCESS] ✅ Valid WAV header confirmed in converted file")
-                
-                # Use the converted file
-                audio_file_path = converted_file_path
-                logger.info(f"[PREPROCESS] ✅ Conversion successful, using: {audio_file_path}")
+                audio = decode_to_mono16k(audio_bytes)
             except Exception as e:
-                # Clean up temp file if conversion failed
-                if converted_file_path and os.path.exists(converted_file_path):
-                    try:
-                        os.unlink(converted_file_path)
-                        logger.info(f"[PREPROCESS] Cleaned up failed conversion temp file")
-                    except:
-                        pass
-                error_msg = f"Audio conversion failed: {str(e)}"
-                logger.error(f"[PREPROCESS] ❌ {error_msg}")
-                logger.error(f"[PREPROCESS] Full traceback: {traceback.format_exc()}")
-                logger.error(f"[PREPROCESS] This usually means FFmpeg is not installed or not in PATH")
-                logger.error(f"[PREPROCESS] Install FFmpeg: sudo apt-get install ffmpeg (Ubuntu/Debian)")
-                logger.error(f"[PREPROCESS] Or: brew install ffmpeg (macOS)")
-                raise ValueError(error_msg) from e
+                raise ValueError(f"Failed to decode audio: {e}") from e
+            sr = TARGET_SAMPLE_RATE
+            logger.debug("[PREPROCESS] Decoded %d samples at %dHz with PyAV", len(audio), sr)
         else:
-            logger.info(f"[PREPROCESS] ✅ File is already WAV format, no conversion needed")
-        
-        # Load audio file using scipy (now guaranteed to be WAV)
-        try:
-            logger.info(f"[PREPROCESS] Reading WAV file with scipy.wavfile.read(): {audio_file_path}")
-            # Double-check header before reading
-            with open(audio_file_path, 'rb') as f:
-                final_header = f.read(4)
-                logger.info(f"[PREPROCESS] Final file header before scipy read: {final_header}")
-            sr, audio = wavfile.read(audio_file_path)
-            logger.info(f"[PREPROCESS] ✅ Loaded WAV file: {len(audio)} samples at {sr}Hz")
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"[PREPROCESS] ❌ Failed to read WAV file with scipy: {error_msg}")
-            logger.error(f"[PREPROCESS] Full traceback: {traceback.format_exc()}")
-            # If the error mentions RIFF/RIFX, it means the file wasn't converted properly
-            if 'RIFF' in error_msg or 'RIFX' in error_msg:
-                logger.error(f"[PREPROCESS] This is the exact error the user is seeing!")
-                raise ValueError(
-                    f"File format error - conversion may have failed. "
-                    f"Original error: {error_msg}. "
-                    f"Please ensure FFmpeg is installed: sudo apt-get install ffmpeg"
-                ) from e
-            raise ValueError(f"Failed to read WAV file: {error_msg}") from e
-
-        # Convert to float and normalize
-        if audio.dtype == np.int16:
-            audio = audio.astype(np.float32) / 32768.0
-        elif audio.dtype == np.int32:
-            audio = audio.astype(np.float32) / 2147483648.0
-        elif audio.dtype == np.uint8:
-            audio = (audio.astype(np.float32) - 128.0) / 128.0
-
-        # Handle stereo audio (convert to mono by averaging channels)
-        if len(audio.shape) > 1:
-            audio = np.mean(audio, axis=1)
-
-        # Resample if necessary
-        if sr != target_sr:
-            num_samples = int(len(audio) * target_sr / sr)
-            audio = resample(audio, num_samples)
-
-        # Normalize audio
-        if np.max(np.abs(audio)) > 0:
-            audio = audio / np.max(np.abs(audio))
-
-        # Calculate duration
-        duration = len(audio) / target_sr
-
-        # Validate audio length
-        if duration < MIN_AUDIO_LENGTH:
-            raise ValueError(
-                f"Audio too short: {duration:.2f}s " f"(minimum: {MIN_AUDIO_LENGTH}s)"
-            )
+            sr, audio = load_audio_with_pydub(audio_bytes, file_ext)
 
-        if duration > MAX_AUDIO_LENGTH:
-            raise ValueError(
-                f"Audio too long: {duration:.2f}s " f"(maximum: {MAX_AUDIO_LENGTH}s)"
-            )
+        # Reject bad lengths before paying for resampling
+        _check_duration(len(audio) / sr)
+
+        if sr == target_sr and audio.ndim == 1 and audio.dtype != np.uint8:
+            # Usual case (decoders already give 16kHz mono): convert and
+            # peak-normalize together
+            audio = _to_normalized_float32(audio)
+        else:
+            # Convert to float32 mono (stereo is averaged)
+            audio = _to_mono_float32(audio)
+
+            # Resample if necessary (polyphase FIR: cost does not depend on
+            # the prime factors of the length, unlike FFT resampling)
+            if sr != target_sr:
+                g = math.gcd(sr, target_sr)
+                audio = resample_poly(audio, target_sr // g, sr // g)
+
+            # Normalize audio
+            audio = _peak_normalize(audio)
+
+        return audio, len(audio) / target_sr
+
+    except ValueError as e:
+        # Bad or unsupported input; the message says what was wrong
+        logger.error("[PREPROCESS] ❌ Error preprocessing audio: %s", e)
+        raise
+    except Exception:
+        logger.exception("[PREPROCESS] ❌ Error preprocessing audio")
+        raise
+
+
+def _forward(input_values: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """Run the model (ONNX Runtime or PyTorch) and return fp32 logits"""
+    if onnx_session is not None:
+        # Bind the arrays in place (no feed dict, no dtype copy of the mask)
+        # and have the logits written straight to host memory
+        binding = onnx_session.io_binding()
+        binding.bind_cpu_input("input_values", input_values.numpy())
+        binding.bind_cpu_input("attention_mask", attention_mask.numpy())
+        binding.bind_output("logits")
+        onnx_session.run_with_iobinding(binding)
+        return torch.from_numpy(binding.copy_outputs_to_cpu()[0])
+
+    # Move to GPU if available (the model runs in fp16 there). The mask is
+    # rebuilt on the device from the lengths rather than copied over, and
+    # the inputs arrive unnormalized (see transcribe_batch)
+    if torch.cuda.is_available():
+        lengths = attention_mask.sum(-1).cuda()
+        input_values = input_values.to("cuda", non_blocking=True)
+        positions = torch.arange(input_values.shape[1], device="cuda")
+        attention_mask = (positions < lengths[:, None]).long()
+        if _normalize_inputs:
+            input_values = _normalize_on_device(input_values, attention_mask)
+        input_values = input_values.half()
+
+    # A single request that fits a captured bucket replays its graph
+    if _cuda_graphs and input_values.shape[0] == 1:
+        num_samples = input_values.shape[1]
+        for bucket_samples, input_buf, mask_buf, graph, logits_buf in _cuda_graphs:
+            if num_samples <= bucket_samples:
+                input_buf.zero_()
+                input_buf[:, :num_samples].copy_(input_values)
+                mask_buf.zero_()
+                mask_buf[:, :num_samples] = 1
+                graph.replay()
+                # Copy out: the buffer is overwritten by the next replay
+                return logits_buf.float()
+
+    if _compiled_model is not None:
+        return _run_compiled(input_values, attention_mask)
+
+    if _traced_model is not None:
+        with torch.no_grad():
+            return _traced_model(input_values, attention_mask)["logits"].float()
+
+    # argmax/softmax run on fp32 logits
+    with torch.inference_mode():
+        return model(input_values, attention_mask=attention_mask).logits.float()
+
+
+def _run_compiled(input_values: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """
+    Run the torch.compile'd model on a batch padded to a known shape: the
+    time axis to the next CUDA_GRAPH_BUCKETS length and the batch to the
+    next COMPILE_BATCH_SIZES size (bigger batches, e.g. of chunks, run in
+    MAX_BATCH slices), so only graphs compiled at startup are used.
+    The mask keeps padded samples out of the results, and padded rows
+    are dropped
+    """
+    rows, num_samples = input_values.shape
+    if rows > MAX_BATCH:
+        return torch.cat([
+            _run_compiled(input_values[i:i + MAX_BATCH], attention_mask[i:i + MAX_BATCH])
+            for i in range(0, rows, MAX_BATCH)
+        ])
+
+    bucket_samples = next(
+        (seconds * TARGET_SAMPLE_RATE for seconds in CUDA_GRAPH_BUCKETS
+         if seconds * TARGET_SAMPLE_RATE >= num_samples),
+        num_samples,
+    )
+    batch_size = next(size for size in COMPILE_BATCH_SIZES if size >= rows)
+    input_values = torch.nn.functional.pad(
+        input_values, (0, bucket_samples - num_samples, 0, batch_size - rows)
+    )
+    attention_mask = torch.nn.functional.pad(attention_mask, (0, bucket_samples - num_samples))
+    # Padded rows are silence with a full mask, like the warm-up batches
+    attention_mask = torch.nn.functional.pad(attention_mask, (0, 0, 0, batch_size - rows), value=1)
+    # no_grad rather than inference_mode, which torch.compile doesn't
+    # handle well
+    with torch.no_grad():
+        return _compiled_model(input_values, attention_mask=attention_mask).logits[:rows].float()
+
+
+def _build_inputs(
+    audio_arrays: list[np.ndarray], normalize: bool = True
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """
+    Zero-pad audio arrays into one batch, normalizing each to zero mean and
+    unit variance over its own samples (what the feature extractor does)
+    unless normalize is False
+    Returns (input_values, attention_mask)
+    """
+    max_len = max(len(audio_array) for audio_array in audio_arrays)
+    size = len(audio_arrays) * max_len
+    if _pinned_inputs is not None and size <= _pinned_inputs.numel():
+        # Stage in pinned memory so the copy to the GPU can be asynchronous.
+        # Batches run one at a time, and each one's copy has finished by
+        # the time its logits are read, so the buffer is free to reuse.
+        input_tensor = _pinned_inputs[:size].view(len(audio_arrays), max_len)
+    else:
+        input_tensor = torch.empty(len(audio_arrays), max_len, dtype=torch.float32)
+    input_values = input_tensor.numpy()
+    attention_mask = np.zeros((len(audio_arrays), max_len), dtype=np.int64)
+    for i, audio_array in enumerate(audio_arrays):
+        n = len(audio_array)
+        row = input_values[i, :n]
+        if normalize and _normalize_inputs:
+            # Written in place into the (pinned) row: no temporaries
+            np.subtract(audio_array, audio_array.mean(), out=row)
+            row *= 1.0 / np.sqrt(np.dot(row, row) / n + 1e-7)
+        else:
+            row[:] = audio_array
+        input_values[i, n:] = 0.0
+        attention_mask[i, :n] = 1
+    return input_tensor, torch.from_numpy(attention_mask)
+
+
+def _normalize_on_device(input_values: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """
+    _build_inputs' normalization for a zero-padded fp32 batch already on
+    the GPU: zero mean and unit variance over each row's unpadded samples
+    """
+    mask = attention_mask.to(input_values.dtype)
+    lengths = mask.sum(-1, keepdim=True)
+    centered = (input_values - input_values.sum(-1, keepdim=True) / lengths) * mask
+    variance = centered.square().sum(-1, keepdim=True) / lengths
+    return centered * torch.rsqrt(variance + 1e-7)
+
+
+def _ctc_decode(predicted_ids: torch.Tensor) -> str:
+    """Greedy CTC decode: collapse repeated ids, drop blanks, map to text"""
+    ids = torch.unique_consecutive(predicted_ids)
+    ids = ids[ids != _ctc_blank_id].tolist()
+    text = "".join([_ctc_tokens[i] for i in ids]).strip()
+    if processor.tokenizer.clean_up_tokenization_spaces:
+        text = processor.tokenizer.clean_up_tokenization(text)
+    return text
 
-        return audio, duration
+
+def _split_chunks(audio_array: np.ndarray) -> list[tuple[np.ndarray, int, int]]:
+    """
+    Split audio longer than CHUNK_SECONDS into windows overlapping by
+    CHUNK_OVERLAP_SECONDS (see CHUNK_SECONDS)
+    Returns (chunk, first, last) per window: the chunk's samples in
+    [first, last) are the ones its output is kept for. Overlaps are split
+    at their midpoint, so every sample is covered exactly once
+    """
+    window = CHUNK_SECONDS * TARGET_SAMPLE_RATE
+    if CHUNK_SECONDS <= 0 or len(audio_array) <= window:
+        return [(audio_array, 0, len(audio_array))]
+
+    overlap = CHUNK_OVERLAP_SECONDS * TARGET_SAMPLE_RATE
+    chunks = []
+    for start in range(0, len(audio_array) - overlap, window - overlap):
+        chunk = audio_array[start:start + window]
+        first = overlap // 2 if start > 0 else 0
+        last = len(chunk) - overlap // 2 if start + window < len(audio_array) else len(chunk)
+        chunks.append((chunk, first, last))
+    return chunks
+
+
+def transcribe_batch(audio_arrays: list[np.ndarray]) -> list[tuple[str, float]]:
+    """
+    Transcribe several audio arrays to Persian text in one forward pass
+    Inputs are zero-padded to the longest one; the attention mask keeps
+    the padding out of the results. Long inputs may run as several chunks
+    (see CHUNK_SECONDS) whose outputs are joined before decoding
+    Returns (transcription, confidence score) per input, in order
+    """
+    try:
+        pieces = [_split_chunks(audio_array) for audio_array in audio_arrays]
+        # The PyTorch GPU path normalizes on the device (_forward), keeping
+        # that work off this thread
+        input_values, attention_mask = _build_inputs(
+            [chunk for chunks in pieces for chunk, _, _ in chunks],
+            normalize=onnx_session is not None or not torch.cuda.is_available(),
+        )
+
+        # Perform inference
+        logits = _forward(input_values, attention_mask)
+
+        # Get predicted token IDs, and each frame's top-1 log-probability:
+        # max logit - logsumexp is max(log_softmax) without materializing
+        # the softmax
+        max_logits, predicted_ids = logits.max(dim=-1)
+        top1_logprobs = max_logits - torch.logsumexp(logits, dim=-1)
+
+        # Bring both back from the GPU with one wait, instead of a sync
+        # for every decode and .item() below (ids fit in int16)
+        if predicted_ids.is_cuda:
+            predicted_ids = predicted_ids.to(torch.int16).to("cpu", non_blocking=True)
+            top1_logprobs = top1_logprobs.to("cpu", non_blocking=True)
+            torch.cuda.current_stream().synchronize()
+
+        # Number of logit frames each chunk covers (the rest is padding)
+        frame_counts = model._get_feat_extract_output_lengths(
+            attention_mask.sum(-1)
+        ).tolist()
+        samples_per_frame = math.prod(model.config.conv_stride)
+
+        results = []
+        row = 0
+        for chunks in pieces:
+            ids, logprobs = [], []
+            for chunk, first, last in chunks:
+                num_frames = frame_counts[row]
+                if last < len(chunk):
+                    num_frames = min(num_frames, last // samples_per_frame)
+                ids.append(predicted_ids[row, first // samples_per_frame:num_frames])
+                logprobs.append(top1_logprobs[row, first // samples_per_frame:num_frames])
+                row += 1
+            if len(chunks) > 1:
+                ids, logprobs = [torch.cat(ids)], [torch.cat(logprobs)]
+
+            # Decode to text
+            transcription = _ctc_decode(ids[0])
+
+            # Confidence: geometric mean of the top-1 probabilities of the
+            # frames that emit a token. Blank frames (silence, gaps) are
+            # near-certain and would otherwise dominate; audio with no
+            # tokens at all is scored over every frame
+            token_logprobs = logprobs[0][ids[0] != _ctc_blank_id]
+            if len(token_logprobs) == 0:
+                token_logprobs = logprobs[0]
+            confidence = math.exp(token_logprobs.mean().item())
+
+            results.append((transcription.strip(), confidence))
+        return results
 
     except Exception as e:
-        logger.error(f"[PREPROCESS] ❌ Error preprocessing audio: {e}")
-        logger.error(f"[PREPROCESS] Full traceback: {traceback.format_exc()}")
-        raise e
-    finally:
-        # Clean up converted WAV file if it was temporary
-        if converted_file_path and converted_file_path != original_file_path:
-            if os.path.exists(converted_file_path):
-                try:
-                    os.unlink(converted_file_path)
-                    logger.info(f"[PREPROCESS] Cleaned up temporary WAV file: {converted_file_path}")
-                except Exception as cleanup_error:
-                    logger.warning(f"[PREPROCESS] Could not clean up temp file: {cleanup_error}")
+        logger.error("Error during transcription: %s", e)
+        raise
 
 
 def transcribe_audio(audio_array: np.ndarray) -> tuple[str, float]:
@@ -490,35 +1007,196 @@ def transcribe_audio(audio_array: np.ndarray) -> tuple[str, float]:
     Transcribe audio array to Persian text
     Returns transcription and confidence score
     """
-    try:
-        # Process audio with the processor
-        input_values = processor(
-            audio_array, return_tensors="pt", sampling_rate=TARGET_SAMPLE_RATE
-        ).input_values
+    return transcribe_batch([audio_array])[0]
 
-        # Move to GPU if available
-        if torch.cuda.is_available():
-            input_values = input_values.cuda()
 
-        # Perform inference
-        with torch.no_grad():
-            logits = model(input_values).logits
+def warm_up_model():
+    """
+    Transcribe silence a few times so the first real request doesn't pay
+    for lazy CUDA/cuDNN initialization and autotuning. With torch.compile
+    every length bucket and batch size is compiled here too, so no request
+    waits for a compile. Repeating matters for compiled and traced models:
+    CUDA graphs are recorded, and TorchScript optimizes, only after the
+    first calls
+    """
+    if _compiled_model is None:
+        silence = np.zeros(2 * TARGET_SAMPLE_RATE, dtype=np.float32)
+        for _ in range(WARM_UP_PASSES):
+            transcribe_audio(silence)
+        return
+
+    for seconds in CUDA_GRAPH_BUCKETS:
+        silence = np.zeros(seconds * TARGET_SAMPLE_RATE, dtype=np.float32)
+        for batch_size in COMPILE_BATCH_SIZES:
+            input_values, attention_mask = _build_inputs([silence] * batch_size)
+            for _ in range(WARM_UP_PASSES):
+                _forward(input_values, attention_mask)
+
+
+# Request batching: concurrent requests are queued and run together
+_batch_queue: Optional[asyncio.Queue] = None
+_batch_worker: Optional[asyncio.Task] = None
+# Pool for preprocess_audio, created at startup (see run_preprocess)
+_prep_executor: Optional[ThreadPoolExecutor] = None
+# HTTP client for /transcribe-url, shared so connections are reused
+# (see get_http_session)
+_http_session: Optional[aiohttp.ClientSession] = None
+# Audio digest -> (transcription, confidence, duration), least recent first
+_result_cache: OrderedDict = OrderedDict()
+# Requests admitted by transcribe_bytes and not finished yet
+_in_flight = 0
+
+
+async def _run_batches(queue: asyncio.Queue):
+    """
+    Worker task: wait BATCH_WINDOW_MS after the first queued request,
+    take up to MAX_BATCH requests, and run them grouped by duration
+    (BATCH_BUCKET_SECONDS wide) so short clips aren't padded to long ones
+    """
+    while True:
+        batch = [await queue.get()]
+        await asyncio.sleep(BATCH_WINDOW_MS / 1000)
+        while len(batch) < MAX_BATCH and not queue.empty():
+            batch.append(queue.get_nowait())
+
+        buckets = {}
+        bucket_samples = BATCH_BUCKET_SECONDS * TARGET_SAMPLE_RATE
+        for audio_array, future in batch:
+            bucket = len(audio_array) // bucket_samples
+            buckets.setdefault(bucket, []).append((audio_array, future))
+
+        for items in buckets.values():
+            # Skip requests whose client has gone away
+            items = [(audio_array, future) for audio_array, future in items if not future.done()]
+            if not items:
+                continue
+            try:
+                results = await asyncio.to_thread(
+                    transcribe_batch, [audio_array for audio_array, _ in items]
+                )
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
 
-        # Get predicted token IDs
-        predicted_ids = torch.argmax(logits, dim=-1)
 
-        # Decode to text
-        transcription = processor.batch_decode(predicted_ids)[0]
+async def transcribe_queued(audio_array: np.ndarray) -> tuple[str, float]:
+    """
+    Transcribe audio through the batching worker
+    Returns transcription and confidence score
+    """
+    global _batch_queue, _batch_worker
 
-        # Calculate confidence (based on max logit value)
-        max_logits = torch.max(torch.softmax(logits, dim=-1))
-        confidence = float(max_logits)
+    loop = asyncio.get_running_loop()
+    if _batch_worker is None or _batch_worker.done() or _batch_worker.get_loop() is not loop:
+        _batch_queue = asyncio.Queue()
+        _batch_worker = loop.create_task(_run_batches(_batch_queue))
 
-        return transcription.strip(), confidence
+    future = loop.create_future()
+    await _batch_queue.put((audio_array, future))
+    return await future
 
-    except Exception as e:
-        print(f"Error during transcription: {e}")
-        raise e
+
+async def run_preprocess(audio_bytes: bytes, file_ext: str = "") -> tuple[np.ndarray, float]:
+    """
+    Run preprocess_audio on the preprocessing pool, off the event loop
+    (the default executor is used if the pool hasn't been created)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_prep_executor, preprocess_audio, audio_bytes, file_ext)
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    The shared HTTP client for /transcribe-url, created on first use
+    (inside the running event loop) and closed in shutdown_event
+    """
+    global _http_session
+
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=30),
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+        )
+    return _http_session
+
+
+def _audio_digest(audio_bytes: bytes) -> bytes:
+    """16-byte digest of uploaded audio (BLAKE3 if installed, else BLAKE2b)"""
+    if blake3 is not None:
+        return blake3.blake3(audio_bytes).digest(length=16)
+    return hashlib.blake2b(audio_bytes, digest_size=16).digest()
+
+
+async def transcribe_bytes(audio_bytes: bytes, file_ext: str = "") -> tuple[str, float, float]:
+    """
+    Preprocess and transcribe uploaded audio, reusing the result of an
+    identical recent upload
+    Raises HTTPException (503) when MAX_IN_FLIGHT requests are in progress
+    Returns (transcription, confidence, duration)
+    """
+    global _in_flight
+
+    key = None
+    if RESULT_CACHE_SIZE > 0:
+        key = _audio_digest(audio_bytes)
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+            logger.debug("[TRANSCRIBE] Result cache hit")
+            return cached
+
+    if _in_flight >= MAX_IN_FLIGHT:
+        logger.warning("[TRANSCRIBE] Busy (%d requests in flight), rejecting", _in_flight)
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    _in_flight += 1
+    try:
+        # Load and preprocess audio (decoded from memory, any format)
+        audio_array, duration = await run_preprocess(audio_bytes, file_ext)
+
+        # Transcribe audio
+        transcription, confidence = await transcribe_queued(audio_array)
+    finally:
+        _in_flight -= 1
+
+    result = (transcription, confidence, duration)
+    if key is not None:
+        _result_cache[key] = result
+        if len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+    return result
+
+
+def _check_upload_size(size: Optional[int]):
+    """Raise HTTPException (413) if size (bytes, None if unknown) is over MAX_UPLOAD_BYTES"""
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Audio data too large (maximum: {MAX_UPLOAD_BYTES} bytes)",
+        )
+
+
+async def _read_limited(read) -> bytes:
+    """
+    Read a body through read(n) (UploadFile.read, aiohttp's
+    StreamReader.read), UPLOAD_CHUNK_SIZE bytes at a time
+    Raises HTTPException (413) as soon as it exceeds MAX_UPLOAD_BYTES
+    """
+    chunks = []
+    size = 0
+    while chunk := await read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        _check_upload_size(size)
+        chunks.append(chunk)
+    return b"".join(chunks)
 
 
 # Dependency to ensure model is loaded
@@ -532,30 +1210,57 @@ async def get_model():
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup and check dependencies"""
-    # Check if FFmpeg is available (required for audio conversion)
-    try:
-        import subprocess
-        result = subprocess.run(
-            ['ffmpeg', '-version'],
-            capture_output=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            logger.info("✅ FFmpeg is available for audio conversion")
-            logger.info(f"   FFmpeg version: {result.stdout.split(chr(10))[0]}")
-        else:
-            logger.warning("⚠️  WARNING: FFmpeg check failed. Audio conversion may not work.")
-            logger.warning("   Install FFmpeg: sudo apt-get install ffmpeg")
-    except FileNotFoundError:
+    global _prep_executor
+
+    # Check if FFmpeg is available (required for audio conversion).
+    # A PATH lookup answers that; only spawn ffmpeg for its version when
+    # debug logging is on.
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path:
+        logger.info("✅ FFmpeg is available for audio conversion: %s", ffmpeg_path)
+        if logger.isEnabledFor(logging.DEBUG):
+            try:
+                result = subprocess.run(
+                    [ffmpeg_path, '-hide_banner', '-version'],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    timeout=5
+                )
+                logger.debug("   FFmpeg version: %s", result.stdout.split("\n")[0])
+            except Exception as e:
+                logger.debug("   Could not read FFmpeg version: %s", e)
+    else:
         logger.error("⚠️  WARNING: FFmpeg is NOT installed or not in PATH")
         logger.error("   Audio format conversion (M4A, MP3, etc.) will fail!")
         logger.error("   Install FFmpeg: sudo apt-get install ffmpeg")
-    except Exception as e:
-        logger.warning(f"⚠️  WARNING: Could not check FFmpeg: {e}")
     
+    _prep_executor = ThreadPoolExecutor(max_workers=PREP_THREADS, thread_name_prefix="prep")
+
     # Load model
     await load_model()
 
+    # Run a dummy forward pass now rather than on the first request
+    try:
+        warm_up_model()
+        logger.info("✅ Model warmed up")
+    except Exception as e:
+        logger.warning("Model warm-up failed: %s", e)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the preprocessing threads and close the HTTP client"""
+    global _prep_executor, _http_session
+
+    if _prep_executor is not None:
+        _prep_executor.shutdown(wait=False, cancel_futures=True)
+        _prep_executor = None
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
+
 
 @app.get("/", response_model=Dict[str, str])
 async def root():
@@ -574,6 +1279,7 @@ async def health_check():
     return HealthResponse(
         status="healthy",
         model_loaded=model_loaded,
+        requests_in_flight=_in_flight,
         service="Persian Speech-to-Text FastAPI Service",
     )
 
@@ -586,10 +1292,8 @@ async def transcribe_audio_file(
     Transcribe audio file uploaded via multipart/form-data
     Accepts any audio format and converts to WAV automatically
     """
-    start_time = asyncio.get_event_loop().time()
-    logger.info("=" * 80)
-    logger.info("[TRANSCRIBE] New transcription request received")
-    logger.info("=" * 80)
+    start_time = time.perf_counter()
+    logger.debug("[TRANSCRIBE] New transcription request received")
 
     try:
         # Get file extension from filename or content-type
@@ -598,95 +1302,55 @@ async def transcribe_audio_file(
         # Try to get from filename first
         if audio.filename:
             file_extension = Path(audio.filename).suffix.lower()
-            logger.info(f"[TRANSCRIBE] Detected extension from filename: {file_extension}")
         
         # If no extension in filename, try content-type
         if not file_extension and audio.content_type:
-            content_type_map = {
-                'audio/wav': '.wav',
-                'audio/mpeg': '.mp3',
-                'audio/mp4': '.m4a',
-                'audio/x-m4a': '.m4a',
-                'audio/flac': '.flac',
-                'audio/ogg': '.ogg',
-                'audio/aac': '.aac',
-            }
-            file_extension = content_type_map.get(audio.content_type)
-            if file_extension:
-                logger.info(f"[TRANSCRIBE] Detected extension from content-type '{audio.content_type}': {file_extension}")
+            file_extension = _CONTENT_TYPE_EXT.get(audio.content_type)
         
         # Default to .m4a if still unknown (common for mobile recordings)
         if not file_extension:
             file_extension = ".m4a"
-            logger.info(f"[TRANSCRIBE] No extension detected, defaulting to: {file_extension}")
-        
-        # Log the incoming file format
-        logger.info(f"[TRANSCRIBE] 📥 Received audio file: {audio.filename or 'unnamed'}")
-        logger.info(f"[TRANSCRIBE]    Extension: {file_extension}")
-        logger.info(f"[TRANSCRIBE]    Content-Type: {audio.content_type}")
+            logger.debug("[TRANSCRIBE] No extension detected, defaulting to: %s", file_extension)
         
         # Accept any format - we'll convert to WAV if needed
         # No need to restrict here since conversion handles all formats
 
-        # Save uploaded file temporarily with detected extension
-        logger.info(f"[TRANSCRIBE] Saving uploaded file to temp location...")
-        with tempfile.NamedTemporaryFile(
-            delete=False, suffix=file_extension
-        ) as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_path = temp_file.name
-        
-        logger.info(f"[TRANSCRIBE] 💾 Saved uploaded file to: {temp_path} ({len(content)} bytes)")
+        # The upload is decoded straight from memory (no temp file)
+        _check_upload_size(audio.size)
+        content = await _read_limited(audio.read)
+        logger.info(
+            "[TRANSCRIBE] 📥 Received audio file: %s (extension: %s, content-type: %s, %d bytes)",
+            audio.filename or "unnamed", file_extension, audio.content_type, len(content),
+        )
         
-        # Log first few bytes of the file
-        if len(content) >= 16:
-            header_bytes = content[:16]
-            header_hex = ' '.join(f'{b:02x}' for b in header_bytes)
-            logger.info(f"[TRANSCRIBE] File header (first 16 bytes, hex): {header_hex}")
-            logger.info(f"[TRANSCRIBE] File header (first 16 bytes, raw): {header_bytes}")
+        # Log first few bytes of the file (debug only; the hex dump is not free)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[TRANSCRIBE] File header (first 16 bytes, hex): %s", content[:16].hex(" "))
 
-        try:
-            # Load and preprocess audio (this will convert to WAV if needed)
-            logger.info(f"[TRANSCRIBE] Starting audio preprocessing...")
-            audio_array, duration = preprocess_audio(temp_path)
-            logger.info(f"[TRANSCRIBE] ✅ Audio preprocessing completed: {duration:.2f}s duration")
-
-            # Transcribe audio
-            logger.info(f"[TRANSCRIBE] Starting transcription...")
-            transcription, confidence = transcribe_audio(audio_array)
-            logger.info(f"[TRANSCRIBE] ✅ Transcription completed: '{transcription[:50]}...'")
-
-            processing_time = asyncio.get_event_loop().time() - start_time
-            logger.info(f"[TRANSCRIBE] Total processing time: {processing_time:.2f}s")
-
-            return TranscriptionResponse(
-                success=True,
-                transcription=transcription,
-                confidence=confidence,
-                audio_duration=duration,
-                processing_time=processing_time,
-            )
+        transcription, confidence, duration = await transcribe_bytes(content, file_extension)
 
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                    logger.info(f"[TRANSCRIBE] Cleaned up temp file: {temp_path}")
-                except Exception as cleanup_error:
-                    logger.warning(f"[TRANSCRIBE] Could not clean up temp file: {cleanup_error}")
+        processing_time = time.perf_counter() - start_time
+        logger.info(
+            "[TRANSCRIBE] ✅ Transcribed %.2fs of audio in %.2fs: '%.50s...'",
+            duration, processing_time, transcription,
+        )
 
+        return TranscriptionResponse(
+            success=True,
+            transcription=transcription,
+            confidence=confidence,
+            audio_duration=duration,
+            processing_time=processing_time,
+        )
+
+    except HTTPException:
+        raise
     except ValueError as e:
-        logger.error(f"[TRANSCRIBE] ❌ ValueError: {str(e)}")
-        logger.error(f"[TRANSCRIBE] Full traceback: {traceback.format_exc()}")
+        # Already logged where it was raised (see preprocess_audio)
         raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
-        logger.error(f"[TRANSCRIBE] ❌ Exception: {str(e)}")
-        logger.error(f"[TRANSCRIBE] Full traceback: {traceback.format_exc()}")
-        raise HTTPException(
-            status_code=500, detail=f"Transcription failed: {str(e)}"
-        ) from e
+        logger.exception("[TRANSCRIBE] ❌ Exception: %s", e)
+        raise HTTPException(status_code=500, detail="Transcription failed") from e
 
 
 @app.post("/transcribe-base64", response_model=TranscriptionResponse)
@@ -696,7 +1360,7 @@ async def transcribe_base64_audio(
     """
     Transcribe base64 encoded audio data
     """
-    start_time = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
 
     try:
         # Get audio data from request (supports both 'audio' and 'audio_base64' field names)
@@ -706,9 +1370,10 @@ async def transcribe_base64_audio(
                 status_code=400, detail="Missing 'audio' or 'audio_base64' field in request"
             )
         
-        # Decode base64 audio
+        # Decode base64 audio (4 characters per 3 bytes)
+        _check_upload_size(len(audio_base64_str) // 4 * 3)
         try:
-            audio_data = base64.b64decode(audio_base64_str)
+            audio_data = (pybase64 or base64).b64decode(audio_base64_str)
         except Exception as e:
             raise HTTPException(
                 status_code=400, detail=f"Invalid base64 audio data: {str(e)}"
@@ -726,74 +1391,36 @@ async def transcribe_base64_audio(
         
         # Try content_type second
         if not file_ext and request.content_type:
-            content_type_map = {
-                'audio/wav': '.wav',
-                'audio/mpeg': '.mp3',
-                'audio/mp4': '.m4a',
-                'audio/x-m4a': '.m4a',
-                'audio/flac': '.flac',
-                'audio/ogg': '.ogg',
-                'audio/aac': '.aac',
-            }
-            file_ext = content_type_map.get(request.content_type, '.m4a')
+            file_ext = _CONTENT_TYPE_EXT.get(request.content_type, '.m4a')
         
         # Fallback: detect from file header
         if not file_ext:
-            if len(audio_data) >= 4:
-                header = audio_data[:4]
-                if header == b'RIFF' or header == b'RIFX':
-                    file_ext = ".wav"
-                elif header[:3] == b'ID3' or (len(audio_data) >= 2 and audio_data[0:2] == b'\xff\xfb'):
-                    file_ext = ".mp3"
-                elif header[:4] == b'fLaC':
-                    file_ext = ".flac"
-                elif header[:4] == b'OggS':
-                    file_ext = ".ogg"
-                elif header[:4] == b'\x00\x00\x00':  # M4A/MP4 often starts with this
-                    file_ext = ".m4a"
-                else:
-                    file_ext = ".m4a"  # Default fallback
-            else:
-                file_ext = ".m4a"  # Default fallback
+            file_ext = _detect_ext(audio_data)
         
         # Ensure extension is in supported formats (or allow conversion)
         # Note: We'll convert any format, so we don't need to restrict here
         if file_ext not in SUPPORTED_FORMATS:
-            print(f"Warning: {file_ext} not in SUPPORTED_FORMATS, but will attempt conversion")
+            logger.warning("%s not in SUPPORTED_FORMATS, but will attempt conversion", file_ext)
         
-        # Save to temporary file with detected extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            temp_file.write(audio_data)
-            temp_path = temp_file.name
-
-        try:
-            # Load and preprocess audio
-            audio_array, duration = preprocess_audio(temp_path)
-
-            # Transcribe audio
-            transcription, confidence = transcribe_audio(audio_array)
+        transcription, confidence, duration = await transcribe_bytes(audio_data, file_ext)
 
-            processing_time = asyncio.get_event_loop().time() - start_time
+        processing_time = time.perf_counter() - start_time
 
-            return TranscriptionResponse(
-                success=True,
-                transcription=transcription,
-                confidence=confidence,
-                audio_duration=duration,
-                processing_time=processing_time,
-            )
-
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        return TranscriptionResponse(
+            success=True,
+            transcription=transcription,
+            confidence=confidence,
+            audio_duration=duration,
+            processing_time=processing_time,
+        )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Transcription failed: {str(e)}"
-        ) from e
+        logger.exception("[TRANSCRIBE] ❌ Exception: %s", e)
+        raise HTTPException(status_code=500, detail="Transcription failed") from e
 
 
 @app.post("/transcribe-url", response_model=TranscriptionResponse)
@@ -801,51 +1428,37 @@ async def transcribe_audio_url(audio_url: str, _: tuple = Depends(get_model)):
     """
     Transcribe audio from URL (for testing purposes)
     """
-    import aiohttp
-
-    start_time = asyncio.get_event_loop().time()
+    start_time = time.perf_counter()
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(audio_url) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=400, detail="Failed to download audio from URL"
-                    )
-
-                audio_data = await response.read()
-
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            temp_file.write(audio_data)
-            temp_path = temp_file.name
-
-        try:
-            # Load and preprocess audio
-            audio_array, duration = preprocess_audio(temp_path)
+        async with get_http_session().get(audio_url) as response:
+            if response.status != 200:
+                raise HTTPException(
+                    status_code=400, detail="Failed to download audio from URL"
+                )
 
-            # Transcribe audio
-            transcription, confidence = transcribe_audio(audio_array)
+            _check_upload_size(response.content_length)
+            audio_data = await _read_limited(response.content.read)
 
-            processing_time = asyncio.get_event_loop().time() - start_time
+        transcription, confidence, duration = await transcribe_bytes(audio_data)
 
-            return TranscriptionResponse(
-                success=True,
-                transcription=transcription,
-                confidence=confidence,
-                audio_duration=duration,
-                processing_time=processing_time,
-            )
+        processing_time = time.perf_counter() - start_time
 
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        return TranscriptionResponse(
+            success=True,
+            transcription=transcription,
+            confidence=confidence,
+            audio_duration=duration,
+            processing_time=processing_time,
+        )
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
     except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Transcription failed: {str(e)}"
-        ) from e
+        logger.exception("[TRANSCRIBE] ❌ Exception: %s", e)
+        raise HTTPException(status_code=500, detail="Transcription failed") from e
 
 
 # Error handlers
@@ -854,6 +1467,7 @@ async def http_exception_handler(_request, exc):
     return JSONResponse(
         status_code=exc.status_code,
         content={"success": False, "error": exc.detail, "status_code": exc.status_code},
+        headers=exc.headers,
     )
 
 
@@ -861,11 +1475,7 @@ async def http_exception_handler(_request, exc):
 async def general_exception_handler(_request, exc):
     return JSONResponse(
         status_code=500,
-        content={
-            "success": False,
-            "error": "Internal server error",
-            "detail": str(exc),
-        },
+        content={"success": False, "error": "Internal server error"},
     )
 
 
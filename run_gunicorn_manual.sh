@@ -93,9 +93,9 @@ echo ""
 
 # Build gunicorn command
 if [ -f "$GUNICORN_CMD" ]; then
-    FULL_CMD="$GUNICORN_CMD -w 2 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
+    FULL_CMD="$GUNICORN_CMD -w 1 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
 else
-    FULL_CMD="$GUNICORN_CMD -w 2 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
+    FULL_CMD="$GUNICORN_CMD -w 1 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
 fi
 
 echo "4. Gunicorn command:"
@@ -135,7 +135,7 @@ bind = "0.0.0.0:8001"
 backlog = 2048
 
 # Worker processes
-workers = 2
+workers = 1  # one process owns the model (see GUNICORN_SETUP.md)
 worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 timeout = 30
@@ -194,12 +194,12 @@ fi
 # Build ExecStart command (explicitly set port 8001)
 if [ ! -z "$VENV_DIR" ]; then
     if [ -f "$VENV_DIR/bin/gunicorn" ]; then
-        EXEC_START="$VENV_DIR/bin/gunicorn -w 2 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
+        EXEC_START="$VENV_DIR/bin/gunicorn -w 1 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
     else
-        EXEC_START="$VENV_DIR/bin/python -m gunicorn -w 2 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
+        EXEC_START="$VENV_DIR/bin/python -m gunicorn -w 1 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
     fi
 else
-    EXEC_START="$PYTHON_CMD -m gunicorn -w 2 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
+    EXEC_START="$PYTHON_CMD -m gunicorn -w 1 -k uvicorn.workers.UvicornWorker --timeout 30 --preload --bind 0.0.0.0:8001 main:app"
 fi
 
 # Alternative: Use config file (config already has port 8001)
@@ -317,7 +317,7 @@ echo "Done!"
 echo "=========================================="
 echo ""
 echo "Gunicorn is now configured with:"
-echo "  - 2 workers"
+echo "  - 1 worker (requests are batched inside it)"
 echo "  - UvicornWorker class"
 echo "  - 30 second timeout"
 echo "  - Preload enabled"
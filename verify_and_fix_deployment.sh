@@ -26,15 +26,15 @@ if [ -f "$BACKEND_DIR/main.py" ]; then
     echo "   ✅ main.py found"
     
     # Check if it has the conversion logic
-    if grep -q "convert_audio_to_wav" "$BACKEND_DIR/main.py"; then
+    if grep -q "decode_with_pydub" "$BACKEND_DIR/main.py"; then
         echo "   ✅ Conversion function found in main.py"
     else
         echo "   ❌ Conversion function NOT found in main.py"
         echo "   ⚠️  Code may not be updated!"
     fi
     
-    # Check if preprocess_audio calls convert_audio_to_wav
-    if grep -q "should_convert = True" "$BACKEND_DIR/main.py"; then
+    # Check if preprocess_audio decides when to convert
+    if grep -q "should_convert" "$BACKEND_DIR/main.py"; then
         echo "   ✅ Conversion logic found in preprocess_audio"
     else
         echo "   ⚠️  Conversion logic may be missing"